@@ -5,96 +5,330 @@ PRIORITY: SPEED + VOLUME for instant feedback
 FOCUS: Hedef altı = LOUDEST, FASTEST warning for more effort!
 """
 
+import argparse
+import mmap
+import os
+import statistics
 import struct
-import math
+import time
+import wave
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 
-def create_wav_file(filename, samples, sample_rate=44100):
-    """Create a WAV file from samples"""
+import numpy as np
+
+DEFAULT_SAMPLE_RATE = 44100
+FADE_SECONDS = 0.005  # MINIMAL fade (5ms) for maximum speed
+
+# Declarative cue table: every vbt_*.wav is rendered from one row
+# kind: "tone" = single beep, "double" = beep + pause + beep, "pulse" = N beeps with pauses
+VBT_CUES = [
+    # 🟢 TARGET HIT - Quick success beep (800Hz, medium volume, fast)
+    {"name": "vbt_target_hit", "kind": "tone", "frequency": 800, "duration": 0.08, "amplitude": 0.5,
+     "label": "🟢 800Hz, 80ms - QUICK SUCCESS"},
+    # 💎 ABOVE TARGET - Pleasant double beep (1000Hz, good volume): 60ms + 40ms pause + 60ms
+    {"name": "vbt_above_target", "kind": "double", "frequency": 1000, "duration": 0.06, "pause": 0.04,
+     "amplitude": 0.6, "label": "💎 1000Hz double - ACHIEVEMENT"},
+    # 🔴 BELOW TARGET - LOUDEST, MOST URGENT WARNING! (400Hz, MAX VOLUME)
+    # This is THE MOST IMPORTANT sound - needs maximum impact!
+    {"name": "vbt_below_target", "kind": "double", "frequency": 400, "duration": 0.12, "pause": 0.03,
+     "amplitude": 1.0, "label": "🔴 400Hz, MAX VOLUME - URGENT EFFORT NEEDED!"},
+    # 🔥 EXCEPTIONAL - Quick celebration (1200Hz, happy but not too long)
+    {"name": "vbt_exceptional", "kind": "tone", "frequency": 1200, "duration": 0.15, "amplitude": 0.6,
+     "label": "🔥 1200Hz celebration - EXCEPTIONAL!"},
+    # 🏁 SET COMPLETE - Clear finish signal (600Hz, moderate length)
+    {"name": "vbt_set_complete", "kind": "tone", "frequency": 600, "duration": 0.2, "amplitude": 0.5,
+     "label": "🏁 600Hz finish signal"},
+    # ⚠️ FATIGUE WARNING - Pulsing urgent beep (350Hz, high volume), only 2 pulses - faster than 3
+    {"name": "vbt_fatigue_warning", "kind": "pulse", "frequency": 350, "duration": 0.1, "pause": 0.08,
+     "pulses": 2, "amplitude": 0.7, "label": "⚠️ 350Hz urgent pulse - FATIGUE!"},
+]
+
+# Packed cue bank: header + index + PCM blocks, every block page-aligned so a player
+# can mmap the file once and start any cue at index[offset] without parsing WAV chunks
+CUE_BANK_FILENAME = "vbt_cues.bank"
+CUE_BANK_MAGIC = b"VBTCUEB1"
+CUE_BANK_VERSION = 1
+CUE_BANK_ALIGNMENT = 4096
+CUE_BANK_HEADER = struct.Struct('<8sHHIIII4x')  # 32 bytes: magic, version, bits, rate, count, alignment, index offset
+CUE_BANK_ENTRY = struct.Struct('<32sQII')        # name, byte offset, n_samples, crc32(PCM)
+
+# Amplitude profiles for per-athlete / per-venue variants: global gain + optional per-cue gain
+AMPLITUDE_PROFILES = {
+    "default": {"gain": 1.0},
+    "quiet_room": {"gain": 0.6, "cue_gain": {"vbt_below_target": 0.8}},
+    "loud_venue": {"gain": 1.0, "cue_gain": {"vbt_target_hit": 1.6, "vbt_set_complete": 1.6}},
+}
+
+
+def _to_pcm16(samples):
+    return (np.asarray(samples, dtype=np.float64) * 32767).astype('<i2')
+
+
+def create_wav_file(filename, samples, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Create a WAV file from samples (one header pack + one buffer write)"""
+    pcm = _to_pcm16(samples)
+    data_size = pcm.nbytes
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16,         # PCM format chunk
+        1,                   # PCM
+        1,                   # Mono
+        sample_rate,
+        sample_rate * 2,     # Byte rate
+        2,                   # Block align
+        16,                  # Bits per sample
+        b'data', data_size
+    )
     with open(filename, 'wb') as f:
-        # WAV header
-        f.write(b'RIFF')
-        f.write(struct.pack('<I', 36 + len(samples) * 2))
-        f.write(b'WAVE')
-        f.write(b'fmt ')
-        f.write(struct.pack('<I', 16))  # PCM format
-        f.write(struct.pack('<H', 1))   # PCM
-        f.write(struct.pack('<H', 1))   # Mono
-        f.write(struct.pack('<I', sample_rate))
-        f.write(struct.pack('<I', sample_rate * 2))
-        f.write(struct.pack('<H', 2))
-        f.write(struct.pack('<H', 16))
-        f.write(b'data')
-        f.write(struct.pack('<I', len(samples) * 2))
-        
-        # Audio data
-        for sample in samples:
-            f.write(struct.pack('<h', int(sample * 32767)))
-
-def generate_ultra_fast_beep(frequency, duration, amplitude=0.7, sample_rate=44100):
+        f.write(header + pcm.tobytes())
+
+
+def generate_ultra_fast_beep(frequency, duration, amplitude=0.7, sample_rate=DEFAULT_SAMPLE_RATE):
     """Generate ULTRA FAST beep with minimal fade for instant response"""
-    samples = []
-    for i in range(int(sample_rate * duration)):
-        t = i / sample_rate
-        
-        # MINIMAL fade (5ms) for maximum speed
-        fade_samples = int(sample_rate * 0.005)  # 5ms only!
-        fade_factor = 1.0
-        
-        if i < fade_samples:
-            fade_factor = i / fade_samples
-        elif i > len(range(int(sample_rate * duration))) - fade_samples:
-            fade_factor = (len(range(int(sample_rate * duration))) - i) / fade_samples
-            
-        sample = amplitude * fade_factor * math.sin(2 * math.pi * frequency * t)
-        samples.append(sample)
-    return samples
-
-def generate_urgent_double_beep(frequency, duration, pause, amplitude=0.8):
+    n_samples = int(sample_rate * duration)
+    fade_samples = int(sample_rate * FADE_SECONDS)
+    i = np.arange(n_samples)
+
+    fade_factor = np.ones(n_samples)
+    fade_in = i < fade_samples
+    fade_out = ~fade_in & (i > n_samples - fade_samples)
+    fade_factor[fade_in] = i[fade_in] / fade_samples
+    fade_factor[fade_out] = (n_samples - i[fade_out]) / fade_samples
+
+    return amplitude * fade_factor * np.sin(2 * np.pi * frequency * (i / sample_rate))
+
+
+def generate_silence(duration, sample_rate=DEFAULT_SAMPLE_RATE):
+    return np.zeros(int(sample_rate * duration))
+
+
+def generate_urgent_double_beep(frequency, duration, pause, amplitude=0.8, sample_rate=DEFAULT_SAMPLE_RATE):
     """Generate URGENT double beep - FASTEST possible for critical warnings"""
-    beep = generate_ultra_fast_beep(frequency, duration, amplitude)
-    silence = [0.0] * int(44100 * pause)  # Minimal pause
-    return beep + silence + beep
+    beep = generate_ultra_fast_beep(frequency, duration, amplitude, sample_rate)
+    silence = generate_silence(pause, sample_rate)  # Minimal pause
+    return np.concatenate([beep, silence, beep])
+
+
+def generate_pulse_train(frequency, duration, pause, pulses, amplitude=0.7, sample_rate=DEFAULT_SAMPLE_RATE):
+    """Generate N identical beeps separated by short pauses (no trailing pause)"""
+    beep = generate_ultra_fast_beep(frequency, duration, amplitude, sample_rate)
+    period = np.concatenate([beep, generate_silence(pause, sample_rate)])
+    return np.tile(period, pulses)[:len(period) * pulses - (len(period) - len(beep))]
+
+
+def render_cue(cue, sample_rate=DEFAULT_SAMPLE_RATE, profile=None):
+    """Render one cue-table row to float samples in [-1, 1]"""
+    profile = profile or AMPLITUDE_PROFILES["default"]
+    gain = profile.get("gain", 1.0) * profile.get("cue_gain", {}).get(cue["name"], 1.0)
+    amplitude = min(1.0, cue["amplitude"] * gain)
+
+    if cue["kind"] == "tone":
+        return generate_ultra_fast_beep(cue["frequency"], cue["duration"], amplitude, sample_rate)
+    if cue["kind"] == "double":
+        return generate_urgent_double_beep(cue["frequency"], cue["duration"], cue["pause"], amplitude, sample_rate)
+    if cue["kind"] == "pulse":
+        return generate_pulse_train(cue["frequency"], cue["duration"], cue["pause"], cue["pulses"],
+                                    amplitude, sample_rate)
+    raise ValueError(f"Unknown cue kind: {cue['kind']}")
+
+
+def write_cue_bank(filename, cues=VBT_CUES, sample_rate=DEFAULT_SAMPLE_RATE, profile=None,
+                   alignment=CUE_BANK_ALIGNMENT):
+    """Write every cue into one indexed, pre-mixed int16 PCM bank file"""
+    pcm_blocks = [_to_pcm16(render_cue(cue, sample_rate, profile)) for cue in cues]
+
+    index_offset = CUE_BANK_HEADER.size
+    offset = index_offset + CUE_BANK_ENTRY.size * len(cues)
+    entries = []
+    layout = []
+    for cue, pcm in zip(cues, pcm_blocks):
+        offset = -(-offset // alignment) * alignment
+        name = cue["name"].encode("utf-8")
+        if len(name) > 32:
+            raise ValueError(f"Cue name too long for the bank index: {cue['name']}")
+        entries.append(CUE_BANK_ENTRY.pack(name, offset, len(pcm), zlib.crc32(pcm.tobytes())))
+        layout.append((offset, pcm))
+        offset += pcm.nbytes
+
+    buffer = bytearray(offset)
+    CUE_BANK_HEADER.pack_into(buffer, 0, CUE_BANK_MAGIC, CUE_BANK_VERSION, 16, sample_rate,
+                              len(cues), alignment, index_offset)
+    buffer[index_offset:index_offset + CUE_BANK_ENTRY.size * len(cues)] = b"".join(entries)
+    for block_offset, pcm in layout:
+        buffer[block_offset:block_offset + pcm.nbytes] = pcm.tobytes()
+
+    with open(filename, 'wb') as f:
+        f.write(buffer)
+
+
+class CueBank:
+    """Memory-mapped reader for vbt_cues.bank; cue() returns zero-copy int16 views"""
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, bits, sample_rate, count, alignment, index_offset = \
+            CUE_BANK_HEADER.unpack_from(self._mmap, 0)
+        if magic != CUE_BANK_MAGIC:
+            raise ValueError(f"{filename} is not a VBT cue bank")
+        if version != CUE_BANK_VERSION or bits != 16:
+            raise ValueError(f"Unsupported cue bank version {version} / {bits}-bit")
+
+        self.sample_rate = sample_rate
+        self.alignment = alignment
+        self.index = {}
+        for i in range(count):
+            name, offset, n_samples, crc = CUE_BANK_ENTRY.unpack_from(
+                self._mmap, index_offset + i * CUE_BANK_ENTRY.size)
+            self.index[name.rstrip(b"\0").decode("utf-8")] = (offset, n_samples, crc)
+
+    @property
+    def names(self):
+        return list(self.index)
+
+    def cue(self, name):
+        offset, n_samples, _ = self.index[name]
+        return np.frombuffer(self._mmap, dtype='<i2', count=n_samples, offset=offset)
+
+    def verify(self):
+        """Check alignment, bounds and CRC32 of every cue block"""
+        for name, (offset, n_samples, crc) in self.index.items():
+            if offset % self.alignment:
+                raise ValueError(f"Cue {name} is not {self.alignment}-byte aligned")
+            if offset + n_samples * 2 > len(self._mmap):
+                raise ValueError(f"Cue {name} runs past the end of the bank")
+            if zlib.crc32(self.cue(name)) != crc:
+                raise ValueError(f"CRC mismatch for cue {name}")
+        return True
+
+    def close(self):
+        """Release the mapping (drop any cue() views first)"""
+        self._mmap.close()
+
+
+def _first_sample_from_wav(path):
+    with wave.open(path, 'rb') as w:
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')
+    return pcm[0]
+
+
+def benchmark_time_to_first_sample(bank_path, wav_dir, cues=VBT_CUES, repeats=200):
+    """
+    Median time from "cue requested" to first PCM sample available:
+    open + decode of the individual WAV vs. opening the bank and slicing by offset
+    """
+    wav_times = []
+    bank_times = []
+    bank_open_times = []
+    for _ in range(repeats):
+        for cue in cues:
+            start = time.perf_counter()
+            _first_sample_from_wav(os.path.join(wav_dir, f"{cue['name']}.wav"))
+            wav_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        bank = CueBank(bank_path)
+        bank_open_times.append(time.perf_counter() - start)  # paid once per session, not per cue
+        for cue in cues:
+            start = time.perf_counter()
+            bank.cue(cue["name"])[0]
+            bank_times.append(time.perf_counter() - start)
+        bank.close()
+
+    return {
+        "wav_median_us": statistics.median(wav_times) * 1e6,
+        "bank_median_us": statistics.median(bank_times) * 1e6,
+        "bank_open_us": statistics.median(bank_open_times) * 1e6,
+    }
+
+
+def _render_cue_file(cue, sample_rate, profile_name, profile, path):
+    create_wav_file(path, render_cue(cue, sample_rate, profile), sample_rate)
+    return cue, sample_rate, profile_name, path
+
+
+def _write_cue_bank_file(cues, sample_rate, profile_name, profile, path):
+    write_cue_bank(path, cues, sample_rate, profile)
+    return None, sample_rate, profile_name, path
+
+
+def build_sound_bank(output_dir=".", cues=VBT_CUES, sample_rates=(DEFAULT_SAMPLE_RATE,),
+                     profiles=("default",), workers=None):
+    """
+    Render every cue for every sample rate x amplitude profile, plus one
+    packed cue bank per variant. The default variant (first rate, "default"
+    profile) goes straight into output_dir; others go to output_dir/<profile>/<rate>/.
+    Returns (cue, sample_rate, profile_name, path) for every file written;
+    cue is None for the banks.
+    """
+    jobs = []
+    for profile_name in profiles:
+        for sample_rate in sample_rates:
+            if profile_name == "default" and sample_rate == sample_rates[0]:
+                variant_dir = output_dir
+            else:
+                variant_dir = os.path.join(output_dir, profile_name, str(sample_rate))
+            os.makedirs(variant_dir, exist_ok=True)
+            for cue in cues:
+                path = os.path.join(variant_dir, f"{cue['name']}.wav")
+                jobs.append((_render_cue_file, cue, sample_rate, profile_name,
+                             AMPLITUDE_PROFILES[profile_name], path))
+            jobs.append((_write_cue_bank_file, cues, sample_rate, profile_name,
+                         AMPLITUDE_PROFILES[profile_name], os.path.join(variant_dir, CUE_BANK_FILENAME)))
+
+    if workers == 1:
+        return [job[0](*job[1:]) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(*job) for job in jobs]
+        return [future.result() for future in futures]
+
 
 def main():
+    parser = argparse.ArgumentParser(description="PERFORMANCE-OPTIMIZED VBT Audio System")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--sample-rates", default=str(DEFAULT_SAMPLE_RATE),
+                        help="comma-separated, e.g. 44100,48000,22050")
+    parser.add_argument("--profiles", default="default",
+                        help=f"comma-separated amplitude profiles: {', '.join(AMPLITUDE_PROFILES)}")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--benchmark", action="store_true",
+                        help="compare time-to-first-sample: cue bank vs individual WAVs")
+    args = parser.parse_args()
+
+    sample_rates = tuple(int(rate) for rate in args.sample_rates.split(","))
+    profiles = tuple(args.profiles.split(","))
+
     print("⚡ Creating PERFORMANCE-OPTIMIZED VBT Audio System...")
     print("🎯 PRIORITY: SPEED + VOLUME + INSTANT FEEDBACK")
     print("🔥 FOCUS: Hedef altı = LOUDEST + FASTEST warning!")
-    
-    # 🟢 TARGET HIT - Quick success beep (800Hz, medium volume, fast)
-    target_hit = generate_ultra_fast_beep(800, 0.08, 0.5)  # 80ms - FAST
-    create_wav_file('vbt_target_hit.wav', target_hit)
-    print("🟢 Created: vbt_target_hit.wav (800Hz, 80ms - QUICK SUCCESS)")
-    
-    # 💎 ABOVE TARGET - Pleasant double beep (1000Hz, good volume)
-    above_target = generate_urgent_double_beep(1000, 0.06, 0.04, 0.6)  # 60ms + 40ms pause + 60ms
-    create_wav_file('vbt_above_target.wav', above_target)
-    print("💎 Created: vbt_above_target.wav (1000Hz double - ACHIEVEMENT)")
-    
-    # 🔴 BELOW TARGET - LOUDEST, MOST URGENT WARNING! (400Hz, MAX VOLUME)
-    # This is THE MOST IMPORTANT sound - needs maximum impact!
-    below_target = generate_urgent_double_beep(400, 0.12, 0.03, 1.0)  # MAX AMPLITUDE 1.0!
-    create_wav_file('vbt_below_target.wav', below_target)
-    print("🔴 Created: vbt_below_target.wav (400Hz, MAX VOLUME - URGENT EFFORT NEEDED!)")
-    
-    # 🔥 EXCEPTIONAL - Quick celebration (1200Hz, happy but not too long)
-    exceptional = generate_ultra_fast_beep(1200, 0.15, 0.6)  # Longer but still fast
-    create_wav_file('vbt_exceptional.wav', exceptional)
-    print("🔥 Created: vbt_exceptional.wav (1200Hz celebration - EXCEPTIONAL!)")
-    
-    # 🏁 SET COMPLETE - Clear finish signal (600Hz, moderate length)
-    set_complete = generate_ultra_fast_beep(600, 0.2, 0.5)  # Clear but not too long
-    create_wav_file('vbt_set_complete.wav', set_complete)
-    print("🏁 Created: vbt_set_complete.wav (600Hz finish signal)")
-    
-    # ⚠️ FATIGUE WARNING - Pulsing urgent beep (350Hz, high volume)
-    fatigue_beeps = []
-    for i in range(2):  # Only 2 pulses - faster than 3
-        fatigue_beeps.extend(generate_ultra_fast_beep(350, 0.1, 0.7))
-        if i < 1:  # Only one pause
-            fatigue_beeps.extend([0.0] * int(44100 * 0.08))  # Short pause
-    create_wav_file('vbt_fatigue_warning.wav', fatigue_beeps)
-    print("⚠️ Created: vbt_fatigue_warning.wav (350Hz urgent pulse - FATIGUE!)")
-    
+
+    bank_paths = []
+    for cue, sample_rate, profile_name, path in build_sound_bank(
+            args.output_dir, VBT_CUES, sample_rates, profiles, args.workers):
+        label = cue['label'] if cue else "📦 packed cue bank"
+        print(f"Created: {path} ({label}, {sample_rate}Hz, {profile_name})")
+        if cue is None:
+            bank_paths.append(path)
+
+    for bank_path in bank_paths:
+        bank = CueBank(bank_path)
+        bank.verify()
+        bank.close()
+        print(f"✅ Verified: {bank_path}")
+
+    if args.benchmark:
+        # WAVs of a variant sit next to its bank
+        bank_path = bank_paths[0]
+        result = benchmark_time_to_first_sample(bank_path, os.path.dirname(bank_path))
+        print(f"\n⏱️ TIME TO FIRST SAMPLE (median, {bank_path}):")
+        print(f"   📄 Individual WAV (open + decode): {result['wav_median_us']:.1f} µs")
+        print(f"   📦 Cue bank (offset slice):        {result['bank_median_us']:.1f} µs")
+        print(f"   📦 Cue bank open (once):           {result['bank_open_us']:.1f} µs")
+
     print("\n⚡ PERFORMANCE-OPTIMIZED VBT Audio System Created!")
     print("🎯 OPTIMIZATION FEATURES:")
     print("   🔴 Below Target = MAX VOLUME (1.0) + URGENT DOUBLE BEEP")
@@ -110,4 +344,4 @@ def main():
     print("   ⚡ INSTANT athlete response!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
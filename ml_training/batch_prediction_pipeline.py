@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Batched, Streaming VBT Prediction Pipeline
+Scores measurement tables / shards with all three model heads and streams
+flutter_predictions records out as JSON Lines or a compact binary table
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from feature_engineering import MODEL_INPUT_FEATURES, SET_KEYS, build_input_features
+from instrumentation import stage
+from numpy_inference import FATIGUE_OUTPUTS, NumpyMLPPredictor, export_model
+from real_data_collection_protocol import read_table_file
+
+PERFORMANCE_OUTPUTS = ["mean_velocity", "peak_velocity", "rfd", "power", "rom"]
+PERFORMANCE_TARGETS = ["mean_concentric_velocity", "peak_velocity", "rate_of_force_development",
+                       "mean_power", "range_of_motion"]
+TECHNIQUE_CLASSES = ["excellent", "good", "average", "poor"]
+TECHNIQUE_THRESHOLDS = [8.5, 7.0, 5.5]  # technique_rating lower bounds of excellent / good / average
+
+MEASUREMENT_INPUT_COLUMNS = SET_KEYS + ["rep_number", "mean_concentric_velocity", "peak_velocity",
+                                        "mean_power", "range_of_motion", "duration_concentric", "load_kg"]
+
+HEAD_FILES = {
+    "performance": "performance_head.npz",
+    "technique": "technique_head.npz",
+    "fatigue": "fatigue_model.npz",
+}
+
+# Binary output: one fixed-size little-endian record per scored rep
+PREDICTION_DTYPE = np.dtype(
+    [("input_features", "<f4", (len(MODEL_INPUT_FEATURES),))]
+    + [(f"performance_{name}", "<f4") for name in PERFORMANCE_OUTPUTS]
+    + [("technique_class_index", "u1"), ("technique_probabilities", "<f4", (len(TECHNIQUE_CLASSES),))]
+    + [(f"fatigue_{name}", "<f4") for name in FATIGUE_OUTPUTS]
+)
+
+# Prediction bundle: the same records behind a fixed header and an embedded JSON schema,
+# so one file is self-describing. Records start at a 64-byte boundary; rows is patched on close.
+PREDICTION_BUNDLE_MAGIC = b"VBTPRED1"
+PREDICTION_BUNDLE_VERSION = 1
+PREDICTION_BUNDLE_HEADER = struct.Struct('<8sHHIQ')  # magic, version, reserved, schema bytes, rows
+PREDICTION_BUNDLE_ALIGNMENT = 64
+
+
+def prediction_dtype(precision="float32"):
+    """PREDICTION_DTYPE with every float field stored at `precision` (float32 or float16)"""
+    code = np.dtype(precision).newbyteorder("<").str
+    fields = []
+    for name in PREDICTION_DTYPE.names:
+        field = PREDICTION_DTYPE.fields[name][0]
+        fields.append((name, code if field.base.kind == "f" else field.base.str, field.shape))
+    return np.dtype(fields)
+
+
+def technique_labels(technique_rating):
+    """Map expert technique_rating (1-10) to TECHNIQUE_CLASSES indices"""
+    return np.searchsorted(-np.asarray(TECHNIQUE_THRESHOLDS), -np.asarray(technique_rating), side="right")
+
+
+def load_heads(model_dir):
+    missing = [name for name, filename in HEAD_FILES.items()
+               if not os.path.exists(os.path.join(model_dir, filename))]
+    if missing:
+        raise FileNotFoundError(f"Missing model heads {missing} in {model_dir} (run with --train-heads)")
+    with stage("model_load"):
+        return {name: NumpyMLPPredictor(os.path.join(model_dir, filename)) for name, filename in HEAD_FILES.items()}
+
+
+def train_baseline_heads(measurements_df, participants_df, model_dir, feature_cache=None):
+    """
+    Fit linear performance (ridge) and technique (softmax) heads on the
+    model input features and export them to the NumPy runtime format
+    """
+    from sklearn.linear_model import LogisticRegression, Ridge
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    X = build_input_features(measurements_df, participants_df, feature_cache)
+    performance = make_pipeline(StandardScaler(), Ridge(alpha=1.0)).fit(
+        X, measurements_df[PERFORMANCE_TARGETS].to_numpy())
+    export_model(performance, os.path.join(model_dir, HEAD_FILES["performance"]),
+                 output_names=PERFORMANCE_OUTPUTS, source="ridge_performance_head")
+
+    labels = technique_labels(measurements_df["technique_rating"].to_numpy())
+    technique = make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000)).fit(X, labels)
+    header = export_model(technique, os.path.join(model_dir, HEAD_FILES["technique"]),
+                          output_names=[TECHNIQUE_CLASSES[c] for c in technique[-1].classes_],
+                          source="softmax_technique_head")
+    return header
+
+
+def predict_batch(heads, X):
+    """One vectorized call per head for the whole batch"""
+    technique_probabilities = np.zeros((len(X), len(TECHNIQUE_CLASSES)), dtype=np.float32)
+    technique_probabilities[:, heads["technique"].classes] = heads["technique"].predict(X)
+    return {
+        "performance": heads["performance"].predict(X),
+        "technique_probabilities": technique_probabilities,
+        "technique_class_index": technique_probabilities.argmax(axis=1).astype(np.uint8),
+        "fatigue": heads["fatigue"].predict(X),
+    }
+
+
+def _participant_aligned_slices(participant_ids, target_rows):
+    """Row slices of ~target_rows that never split a participant (keeps sets intact)"""
+    codes, _ = pd.factorize(participant_ids)
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    # First participant boundary inside each target_rows-sized bucket
+    _, first_in_bucket = np.unique(starts // target_rows, return_index=True)
+    bounds = np.append(starts[first_in_bucket], len(codes)).tolist()
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _table_path(dataset_dir, table):
+    for fmt in ("vbtc", "parquet", "csv"):
+        path = os.path.join(dataset_dir, f"{table}.{fmt}")
+        if os.path.exists(path):
+            return path, fmt
+    raise FileNotFoundError(f"No {table} table in {dataset_dir}")
+
+
+def iter_measurement_batches(source, batch_rows=65536):
+    """
+    Yield (measurements_df, participants_df) batches from a sharded dataset
+    (manifest.json) or a single dataset directory. Batches hold whole participants.
+    """
+    manifest_path = os.path.join(source, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        fmt = next(f for f in ("vbtc", "parquet", "csv") if f in manifest["formats"])
+        units = [
+            ((os.path.join(source, "shards", shard["files"]["vbt_measurements"][fmt]["path"]), fmt),
+             (os.path.join(source, "shards", shard["files"]["participants"][fmt]["path"]), fmt))
+            for shard in manifest["shards"]
+        ]
+    else:
+        units = [(_table_path(source, "vbt_measurements"), _table_path(source, "participants"))]
+
+    for (measurements_path, measurements_fmt), (participants_path, participants_fmt) in units:
+        participants_df = read_table_file(participants_path, participants_fmt, ["participant_id", "body_mass"])
+        measurements_df = read_table_file(measurements_path, measurements_fmt, MEASUREMENT_INPUT_COLUMNS)
+        for rows in _participant_aligned_slices(measurements_df["participant_id"].to_numpy(), batch_rows):
+            yield measurements_df.iloc[rows], participants_df
+
+
+class JsonLinesWriter:
+    """flutter_predictions records, one JSON object per line"""
+
+    def __init__(self, path):
+        self._file = open(path, 'w')
+        features = ", ".join(["%.7g"] * len(MODEL_INPUT_FEATURES))
+        performance = ", ".join(f'"{name}": %.7g' for name in PERFORMANCE_OUTPUTS)
+        probabilities = ", ".join(["%.7g"] * len(TECHNIQUE_CLASSES))
+        fatigue = ", ".join(f'"{name}": %.7g' for name in FATIGUE_OUTPUTS)
+        self._template = (
+            '{"input_features": [' + features + '], '
+            '"performance_prediction": {' + performance + '}, '
+            '"technique_prediction": {"class": "%s", "class_index": %d, "probabilities": [' + probabilities + ']}, '
+            '"fatigue_prediction": {' + fatigue + '}}\n'
+        )
+
+    def write(self, X, predictions):
+        class_index = predictions["technique_class_index"]
+        class_names = np.asarray(TECHNIQUE_CLASSES, dtype=object)[class_index]
+        columns = (
+            [X[:, i] for i in range(X.shape[1])]
+            + [predictions["performance"][:, i] for i in range(len(PERFORMANCE_OUTPUTS))]
+            + [class_names, class_index]
+            + [predictions["technique_probabilities"][:, i] for i in range(len(TECHNIQUE_CLASSES))]
+            + [predictions["fatigue"][:, i] for i in range(len(FATIGUE_OUTPUTS))]
+        )
+        rows = zip(*[column.tolist() for column in columns])
+        template = self._template
+        self._file.write("".join(template % row for row in rows))
+
+    def close(self):
+        self._file.close()
+
+
+class BinaryPredictionWriter:
+    """Fixed-size PREDICTION_DTYPE records + a JSON schema sidecar; readable with np.memmap"""
+
+    dtype = PREDICTION_DTYPE
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'wb')
+
+    def write(self, X, predictions):
+        records = np.empty(len(X), dtype=self.dtype)
+        records["input_features"] = X
+        for i, name in enumerate(PERFORMANCE_OUTPUTS):
+            records[f"performance_{name}"] = predictions["performance"][:, i]
+        records["technique_class_index"] = predictions["technique_class_index"]
+        records["technique_probabilities"] = predictions["technique_probabilities"]
+        for i, name in enumerate(FATIGUE_OUTPUTS):
+            records[f"fatigue_{name}"] = predictions["fatigue"][:, i]
+        self._file.write(records.tobytes())
+        self.rows += len(records)
+
+    def close(self):
+        self._file.close()
+        schema = {
+            "rows": self.rows,
+            "dtype": PREDICTION_DTYPE.descr,
+            "input_features": MODEL_INPUT_FEATURES,
+            "technique_classes": TECHNIQUE_CLASSES
+        }
+        with open(self.path + ".schema.json", 'w') as f:
+            json.dump(schema, f, indent=2)
+
+
+class PredictionBundleWriter(BinaryPredictionWriter):
+    """
+    Single-file binary predictions: PREDICTION_BUNDLE_HEADER, JSON schema, padding,
+    then fixed-size records (float16 by default, about half of the float32 records)
+    """
+
+    def __init__(self, path, precision="float16"):
+        super().__init__(path)
+        self.dtype = prediction_dtype(precision)
+        schema = json.dumps({
+            "dtype": self.dtype.descr,
+            "precision": precision,
+            "input_features": MODEL_INPUT_FEATURES,
+            "performance_outputs": PERFORMANCE_OUTPUTS,
+            "technique_classes": TECHNIQUE_CLASSES,
+            "fatigue_outputs": FATIGUE_OUTPUTS
+        }, separators=(",", ":")).encode("utf-8")
+        self._schema_bytes = len(schema)
+        self._file.write(PREDICTION_BUNDLE_HEADER.pack(PREDICTION_BUNDLE_MAGIC, PREDICTION_BUNDLE_VERSION, 0,
+                                                       self._schema_bytes, 0))
+        self._file.write(schema)
+        self._file.write(b"\0" * (-self._file.tell() % PREDICTION_BUNDLE_ALIGNMENT))
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(PREDICTION_BUNDLE_HEADER.pack(PREDICTION_BUNDLE_MAGIC, PREDICTION_BUNDLE_VERSION, 0,
+                                                       self._schema_bytes, self.rows))
+        self._file.close()
+
+
+def is_prediction_bundle(path):
+    with open(path, 'rb') as f:
+        return f.read(len(PREDICTION_BUNDLE_MAGIC)) == PREDICTION_BUNDLE_MAGIC
+
+
+def read_prediction_bundle(path):
+    """Memory-map a prediction bundle; returns (records, schema)"""
+    with open(path, 'rb') as f:
+        magic, version, _, schema_bytes, rows = PREDICTION_BUNDLE_HEADER.unpack(f.read(PREDICTION_BUNDLE_HEADER.size))
+        if magic != PREDICTION_BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a prediction bundle")
+        if version != PREDICTION_BUNDLE_VERSION:
+            raise ValueError(f"Unsupported prediction bundle version {version}")
+        schema = json.loads(f.read(schema_bytes))
+    dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2]))
+                      for field in schema["dtype"]])
+    offset = PREDICTION_BUNDLE_HEADER.size + schema_bytes
+    offset += -offset % PREDICTION_BUNDLE_ALIGNMENT
+    if rows == 0:
+        return np.empty(0, dtype=dtype), schema
+    return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(rows,)), schema
+
+
+def read_binary_predictions(path):
+    """Memory-map a binary prediction file written by BinaryPredictionWriter"""
+    with open(path + ".schema.json") as f:
+        schema = json.load(f)
+    dtype = np.dtype([tuple(field) if len(field) == 2 else (field[0], field[1], tuple(field[2]))
+                      for field in schema["dtype"]])
+    return np.memmap(path, dtype=dtype, mode="r", shape=(schema["rows"],))
+
+
+def run_prediction_pipeline(source, output_path, model_dir="sklearn_models", output_format="jsonl",
+                            batch_rows=65536, feature_cache=None):
+    """
+    Stream every measurement in `source` through the three heads into `output_path`.
+    With feature_cache set, each batch's input matrix is reused from / stored in that directory.
+    """
+    heads = load_heads(model_dir)
+    writers = {"jsonl": JsonLinesWriter, "binary": BinaryPredictionWriter, "bundle": PredictionBundleWriter}
+    writer = writers[output_format](output_path)
+    rows = 0
+    try:
+        for measurements_df, participants_df in iter_measurement_batches(source, batch_rows):
+            with stage("feature_build", rows=len(measurements_df)):
+                X = build_input_features(measurements_df, participants_df, feature_cache)
+            with stage("predict", rows=len(X)):
+                predictions = predict_batch(heads, X)
+            with stage(f"write_{output_format}", rows=len(X)):
+                writer.write(X, predictions)
+            rows += len(X)
+    finally:
+        writer.close()
+    return rows
+
+
+def main():
+    """Score a dataset and stream predictions to disk"""
+    parser = argparse.ArgumentParser(description="Batched VBT prediction pipeline")
+    parser.add_argument("source", nargs="?", default="./academic_dataset",
+                        help="dataset directory or sharded dataset (with manifest.json)")
+    parser.add_argument("--output", default="./flutter_predictions/predictions.jsonl")
+    parser.add_argument("--format", choices=["jsonl", "binary", "bundle"], default="jsonl",
+                        help="bundle: single-file float16 records with an embedded schema header")
+    parser.add_argument("--model-dir", default="./sklearn_models")
+    parser.add_argument("--batch-rows", type=int, default=65536)
+    parser.add_argument("--train-heads", action="store_true",
+                        help="fit the linear performance / technique heads on `source` first")
+    parser.add_argument("--feature-cache", default=None,
+                        help="reuse model input features from this cache directory")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+
+    print("🔮 VBT Batch Prediction Pipeline")
+    print("=" * 50)
+
+    if args.train_heads:
+        measurements_path, measurements_fmt = _table_path(args.source, "vbt_measurements")
+        participants_path, participants_fmt = _table_path(args.source, "participants")
+        train_baseline_heads(read_table_file(measurements_path, measurements_fmt),
+                             read_table_file(participants_path, participants_fmt), args.model_dir,
+                             args.feature_cache)
+        print(f"✅ Trained performance / technique heads -> {args.model_dir}/")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    start = time.perf_counter()
+    rows = run_prediction_pipeline(args.source, args.output, args.model_dir, args.format, args.batch_rows,
+                                   args.feature_cache)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ Scored {rows} measurements in {elapsed:.2f} s ({rows / elapsed:,.0f} rows/s)")
+    print(f"   📁 {args.output} ({os.path.getsize(args.output) / 1e6:.2f} MB, {args.format})")
+    instrumentation.finish_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+VBT Benchmark Suite
+Throughput, latency percentiles and traced (tracemalloc) memory peaks for
+generation, audio synthesis, inference, CSV loading and CV, recorded to a
+versioned JSON baseline and compared against it with regression thresholds
+"""
+
+import argparse
+import contextlib
+import fnmatch
+import gc
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from numpy_inference import _load_pickle
+from real_data_collection_protocol import MEASUREMENTS_PER_PARTICIPANT, AcademicVBTDataCollector
+
+FORMAT_NAME = "vbt-benchmarks"
+FORMAT_VERSION = 2
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+# Fewer timed calls than this give no usable spread, so compare() does not judge their latency
+MIN_COMPARE_REPEATS = 5
+# Latency must move by more than this many robust standard deviations (1.4826 x MAD)
+# of the two runs' timings
+NOISE_SIGMAS = 3.0
+
+AUDIO_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "assets", "audio",
+                            "create_performance_optimized_sounds.py")
+
+COHORT_SIZES = (50, 500, 5000)
+QUICK_COHORT_SIZES = (50, 500)
+PREDICTION_BATCH_SIZES = (1, 64, 4096)
+
+
+def _audio_module():
+    spec = importlib.util.spec_from_file_location("create_performance_optimized_sounds", AUDIO_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks: each setup(context) returns (callable, items processed per call)
+# ---------------------------------------------------------------------------
+
+def _generation(n_participants):
+    def setup(context):
+        collector = AcademicVBTDataCollector()
+        output_dir = os.path.join(context["workdir"], f"generation_{n_participants}")
+        return (lambda: collector.generate_sample_academic_dataset(n_participants, output_dir),
+                n_participants * MEASUREMENTS_PER_PARTICIPANT)
+    return setup
+
+
+def _audio_beep(context):
+    audio = context["audio"]
+    duration = 0.12
+    return (lambda: audio.generate_ultra_fast_beep(400, duration, 1.0),
+            int(audio.DEFAULT_SAMPLE_RATE * duration))
+
+
+def _audio_wav(context):
+    audio = context["audio"]
+    samples = audio.generate_urgent_double_beep(400, 0.12, 0.03, 1.0)
+    path = os.path.join(context["workdir"], "benchmark.wav")
+    return lambda: audio.create_wav_file(path, samples), len(samples)
+
+
+def _model_load(context):
+    return lambda: _load_pickle(context["model_path"]), 1
+
+
+def _prediction(batch_size):
+    def setup(context):
+        if "model" not in context:
+            context["model"] = _load_pickle(context["model_path"])
+        model = context["model"]
+        X = np.random.default_rng(0).normal(1.0, 0.5, (batch_size, model.n_features_in_))
+        return lambda: model.predict(X), batch_size
+    return setup
+
+
+def _csv_load(context):
+    path = os.path.join(context["dataset_dir"], "vbt_measurements.csv")
+    return lambda: pd.read_csv(path), len(pd.read_csv(path, usecols=["participant_id"]))
+
+
+def _trace_synthesis(context):
+    from raw_signal_synthesis import rep_sample_counts, synthesize_traces
+
+    measurements_df = pd.read_csv(os.path.join(context["dataset_dir"], "vbt_measurements.csv"))
+    n_samples = rep_sample_counts(measurements_df)
+    columns = [measurements_df[name].to_numpy(np.float64) for name in
+               ("mean_concentric_velocity", "peak_velocity", "range_of_motion")]
+    return (lambda: synthesize_traces(*columns, n_samples / 1000,
+                                      measurements_df["load_kg"].to_numpy(np.float64), n_samples),
+            int(n_samples.sum()))
+
+
+def _cross_validation(context, n_folds=10):
+    from participant_cross_validation import build_cv_matrix, run_cross_validation
+
+    participants_df = pd.read_csv(os.path.join(context["dataset_dir"], "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(context["dataset_dir"], "vbt_measurements.csv"))
+    protocol = AcademicVBTDataCollector().create_ml_training_protocol()
+    X, y, groups, _ = build_cv_matrix(measurements_df, participants_df)
+    return (lambda: run_cross_validation(protocol, X, y, groups, [("linear_regression", None)],
+                                         n_workers=1, max_outer_folds=n_folds),
+            n_folds)
+
+
+def benchmark_specs(quick=False):
+    """(name, unit, repeats, setup) for every benchmark in the suite"""
+    cohorts = QUICK_COHORT_SIZES if quick else COHORT_SIZES
+    scale = 0.2 if quick else 1.0
+
+    def repeats(n):
+        return max(MIN_COMPARE_REPEATS, int(n * scale))
+
+    return (
+        [(f"generation_{n}_participants", "rows", repeats(5 if n < 5000 else 3), _generation(n))
+         for n in cohorts]
+        + [("audio_beep", "samples", repeats(500), _audio_beep),
+           ("audio_wav_write", "samples", repeats(200), _audio_wav),
+           ("fatigue_model_load", "loads", repeats(20), _model_load)]
+        + [(f"fatigue_predict_batch_{n}", "rows", repeats(100 if n < 4096 else 20), _prediction(n))
+           for n in PREDICTION_BATCH_SIZES]
+        + [("csv_load_vbt_measurements", "rows", repeats(20), _csv_load),
+           ("rep_trace_synthesis", "samples", repeats(10), _trace_synthesis),
+           ("cross_validation_10_folds", "folds", repeats(5), _cross_validation)]
+    )
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def measure(function, items, repeats, warmup=1):
+    """
+    Latency percentiles and spread (IQR, MAD) over `repeats` timed calls,
+    throughput at the median, and the traced (Python + NumPy allocations, not
+    RSS) memory peak from one separate call under tracemalloc, so tracing never
+    slows the timed calls down. As in timeit, the garbage collector is off while
+    timing.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            function()
+        latencies = np.empty(repeats)
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for i in range(repeats):
+                start = time.perf_counter()
+                function()
+                latencies[i] = time.perf_counter() - start
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    p25, p50, p75, p95, p99 = np.percentile(latencies, [25, 50, 75, 95, 99]) * 1000
+    return {
+        "items": items,
+        "repeats": repeats,
+        "mean_ms": float(latencies.mean() * 1000),
+        "min_ms": float(latencies.min() * 1000),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "iqr_ms": float(p75 - p25),
+        "mad_ms": float(np.median(np.abs(latencies * 1000 - p50))),
+        "throughput_per_s": float(items / (p50 / 1000)),
+        "traced_peak_mb": peak / 1e6
+    }
+
+
+def run_benchmarks(dataset_dir="./academic_dataset", model_path="sklearn_models/fatigue_model.pkl",
+                   only=None, quick=False, progress=None):
+    """
+    Run the suite into a baseline document; `only` is a list of exact benchmark
+    names or fnmatch globs (e.g. "generation_*")
+    """
+    specs = benchmark_specs(quick)
+    if only:
+        names = [spec[0] for spec in specs]
+        unmatched = [pattern for pattern in only
+                     if not any(fnmatch.fnmatchcase(name, pattern) for name in names)]
+        if unmatched:
+            raise ValueError(f"No benchmark matches {', '.join(unmatched)}; available: {', '.join(names)}")
+        specs = [spec for spec in specs if any(fnmatch.fnmatchcase(spec[0], pattern) for pattern in only)]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        context = {"workdir": workdir, "dataset_dir": dataset_dir, "model_path": model_path,
+                   "audio": _audio_module()}
+        for name, unit, repeats, setup in specs:
+            function, items = setup(context)
+            results[name] = dict(unit=unit, **measure(function, items, repeats))
+            if progress:
+                progress(name, results[name])
+
+    return {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "created": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count()
+        },
+        "quick": quick,
+        "benchmarks": results
+    }
+
+
+def load_baseline(path):
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get("format") != FORMAT_NAME:
+        raise ValueError(f"{path} is not a {FORMAT_NAME} file")
+    if baseline.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path} is version {baseline.get('version')}, expected {FORMAT_VERSION}; "
+                         "record a new baseline")
+    return baseline
+
+
+def save_baseline(document, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(document, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def compare(baseline, current, threshold=0.10, memory_threshold=0.25):
+    """
+    Per-benchmark change of median latency and traced memory peak against the
+    baseline. A benchmark regresses when its traced peak grows by more than
+    `memory_threshold`, or its median latency grows by more than `threshold` and
+    also by more than NOISE_SIGMAS robust standard deviations of the two runs'
+    timings (so jitter within a run does not fail a comparison); improvements
+    are judged the same way in the other direction. Latency is not judged when
+    either run has fewer than MIN_COMPARE_REPEATS timed calls ("too_few_repeats").
+    """
+    rows = []
+    for name, result in current["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None:
+            rows.append({"name": name, "status": "new"})
+            continue
+        latency_change = result["p50_ms"] / reference["p50_ms"] - 1
+        memory_change = (result["traced_peak_mb"] / reference["traced_peak_mb"] - 1
+                         if reference["traced_peak_mb"] > 0 else 0.0)
+        noise_ms = NOISE_SIGMAS * 1.4826 * float(np.hypot(reference["mad_ms"], result["mad_ms"]))
+        difference_ms = result["p50_ms"] - reference["p50_ms"]
+        judged = min(result["repeats"], reference["repeats"]) >= MIN_COMPARE_REPEATS
+        slower = judged and latency_change > threshold and difference_ms > noise_ms
+        faster = judged and latency_change < -threshold and -difference_ms > noise_ms
+        if slower or memory_change > memory_threshold:
+            status = "regression"
+        elif faster:
+            status = "improved"
+        elif not judged:
+            status = "too_few_repeats"
+        else:
+            status = "ok"
+        rows.append({"name": name, "status": status,
+                     "baseline_p50_ms": reference["p50_ms"], "p50_ms": result["p50_ms"], "noise_ms": noise_ms,
+                     "latency_change": latency_change, "memory_change": memory_change})
+    return rows
+
+
+def _print_result(name, result):
+    print(f"   ⏱️ {name:<32} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+          f"{result['throughput_per_s']:>14,.0f} {result['unit']}/s  traced peak {result['traced_peak_mb']:8.2f} MB")
+
+
+def main():
+    """Record a benchmark baseline, or compare a fresh run against one"""
+    parser = argparse.ArgumentParser(description="VBT benchmark suite")
+    parser.add_argument("mode", choices=["run", "compare"], nargs="?", default="run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON written by `run` and read by `compare`")
+    parser.add_argument("--current", default=None,
+                        help="compare this results file instead of running the suite")
+    parser.add_argument("--output", default=None, help="also save the compare run's results here")
+    parser.add_argument("--dataset-dir", default="./academic_dataset")
+    parser.add_argument("--model", default="sklearn_models/fatigue_model.pkl")
+    parser.add_argument("--only", default=None,
+                        help="comma-separated benchmark names or globs, e.g. generation_50_participants,fatigue_*")
+    parser.add_argument("--quick", action="store_true", help="smaller cohorts, fewer repeats")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed median latency growth")
+    parser.add_argument("--memory-threshold", type=float, default=0.25,
+                        help="allowed growth of the tracemalloc (traced allocation) peak")
+    parser.add_argument("--retries", type=int, default=2,
+                        help="re-measure a regressed benchmark this many times; it fails only if every attempt does")
+    args = parser.parse_args()
+
+    print("🏁 VBT Benchmark Suite")
+    print("=" * 50)
+
+    only = args.only.split(",") if args.only else None
+    baseline = load_baseline(args.baseline) if args.mode == "compare" else None
+    if args.current:
+        current = load_baseline(args.current)
+    else:
+        current = run_benchmarks(args.dataset_dir, args.model, only, args.quick, _print_result)
+
+    if args.mode == "run":
+        save_baseline(current, args.baseline)
+        print(f"✅ {len(current['benchmarks'])} benchmarks recorded")
+        print(f"   📁 Baseline: {args.baseline}")
+        return
+
+    rows = compare(baseline, current, args.threshold, args.memory_threshold)
+    if not args.current:
+        # A slow spell on the machine shifts a whole run, which no within-run spread
+        # captures; keep the best of a few attempts before calling it a regression
+        for attempt in range(args.retries):
+            regressed = [row["name"] for row in rows if row["status"] == "regression"]
+            if not regressed:
+                break
+            print(f"🔁 Re-measuring {len(regressed)} regressed benchmark(s), attempt {attempt + 2}")
+            rerun = run_benchmarks(args.dataset_dir, args.model, regressed, args.quick, _print_result)
+            for name, result in rerun["benchmarks"].items():
+                if result["p50_ms"] < current["benchmarks"][name]["p50_ms"]:
+                    current["benchmarks"][name] = result
+            rows = compare(baseline, current, args.threshold, args.memory_threshold)
+    if args.output:
+        save_baseline(current, args.output)
+    icons = {"regression": "🔴", "improved": "🟢", "ok": "⚪", "new": "🆕", "too_few_repeats": "⚠️"}
+    print(f"\n📊 Against {args.baseline} ({baseline['created']}), threshold {args.threshold:.0%} "
+          f"latency (and > {NOISE_SIGMAS:g} sigma of timing noise) / {args.memory_threshold:.0%} traced memory:")
+    for row in rows:
+        if row["status"] == "new":
+            print(f"   {icons['new']} {row['name']:<32} not in baseline")
+            continue
+        note = f" (< {MIN_COMPARE_REPEATS} repeats, latency not judged)" if row["status"] == "too_few_repeats" else ""
+        print(f"   {icons[row['status']]} {row['name']:<32} {row['baseline_p50_ms']:9.3f} -> {row['p50_ms']:9.3f} ms "
+              f"({row['latency_change']:+.1%}, noise ±{row['noise_ms']:.3f} ms), "
+              f"traced memory {row['memory_change']:+.1%}{note}")
+
+    regressions = [row["name"] for row in rows if row["status"] == "regression"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"✅ No regressions ({sum(row['status'] == 'improved' for row in rows)} improved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Typed Columnar Storage for VBT Tables
+One .npy file per column + schema.json, memory-mapped on load
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+FORMAT_NAME = "vbt-columnar"
+FORMAT_VERSION = 1
+TABLE_SUFFIX = ".vbtc"
+
+# Storage dtypes for the academic dataset tables; other float columns default to float32
+MEASUREMENT_STORAGE_DTYPES = {
+    "load_percent_1rm": "int8",
+    "rep_number": "int8",
+    "sampling_rate": "int16",
+}
+PARTICIPANT_STORAGE_DTYPES = {}
+
+
+def _codes_dtype(n_categories):
+    if n_categories <= np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories <= np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+def _categorical_view(codes, categories):
+    dtype = pd.CategoricalDtype(categories)
+    try:
+        return pd.Categorical.from_codes(codes, dtype=dtype, validate=False)
+    except TypeError:  # pandas < 2.1 always validates (and copies) the codes
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+
+
+def _column_filename(index, name):
+    safe_name = "".join(ch if ch.isalnum() or ch in "_-" else "_" for ch in name)
+    return f"{index:03d}_{safe_name}.npy"
+
+
+def write_columnar_table(df, path, dtypes=None):
+    """
+    Write a DataFrame as a typed columnar table directory.
+    Strings become categoricals (codes + categories), floats float32,
+    datetimes native datetime64[us]; `dtypes` overrides per column.
+    """
+    dtypes = dtypes or {}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    columns = []
+    for index, name in enumerate(df.columns):
+        series = df[name]
+        filename = _column_filename(index, name)
+        column = {"name": name, "file": filename}
+
+        if isinstance(series.dtype, pd.CategoricalDtype) or series.dtype == object or pd.api.types.is_string_dtype(series):
+            categorical = series.astype("category").cat
+            values = categorical.codes.to_numpy().astype(_codes_dtype(len(categorical.categories)), copy=False)
+            column["kind"] = "categorical"
+            column["categories"] = [str(category) for category in categorical.categories]
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            values = series.to_numpy().astype("datetime64[us]")
+            column["kind"] = "timestamp"
+        elif pd.api.types.is_float_dtype(series):
+            values = series.to_numpy().astype(dtypes.get(name, "float32"), copy=False)
+            column["kind"] = "numeric"
+        else:
+            values = series.to_numpy().astype(dtypes.get(name, series.dtype), copy=False)
+            column["kind"] = "numeric"
+
+        column["dtype"] = values.dtype.str
+        np.save(os.path.join(tmp_path, filename), np.ascontiguousarray(values))
+        columns.append(column)
+
+    schema = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "rows": len(df),
+        "columns": columns
+    }
+    with open(os.path.join(tmp_path, "schema.json"), 'w') as f:
+        json.dump(schema, f, indent=2)
+
+    # Swap the finished table into place
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return schema
+
+
+class ColumnarTable:
+    """
+    Read side of a columnar table. Numeric, timestamp and categorical-code
+    columns are numpy memmaps over the column files (no copy, no parsing).
+    """
+
+    def __init__(self, path, columns=None, mmap=True):
+        self.path = path
+        with open(os.path.join(path, "schema.json")) as f:
+            self.schema = json.load(f)
+        if self.schema.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} table")
+        if self.schema["version"] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported {FORMAT_NAME} version: {self.schema['version']}")
+
+        by_name = {column["name"]: column for column in self.schema["columns"]}
+        if columns is None:
+            columns = list(by_name)
+        missing = [name for name in columns if name not in by_name]
+        if missing:
+            raise KeyError(f"Unknown columns: {missing}")
+
+        self.columns = list(columns)
+        self._specs = {name: by_name[name] for name in self.columns}
+        self._arrays = {
+            name: np.load(os.path.join(path, spec["file"]), mmap_mode="r" if mmap else None)
+            for name, spec in self._specs.items()
+        }
+
+    def __len__(self):
+        return self.schema["rows"]
+
+    def __getitem__(self, name):
+        """Raw column array (categorical columns return their codes)"""
+        return self._arrays[name]
+
+    def categories(self, name):
+        return self._specs[name].get("categories")
+
+    def to_frame(self):
+        """DataFrame view; numeric columns and categorical codes share memory with the files"""
+        data = {}
+        for name in self.columns:
+            values = self._arrays[name]
+            spec = self._specs[name]
+            if spec["kind"] == "categorical":
+                data[name] = _categorical_view(values, spec["categories"])
+            else:
+                data[name] = values
+        return pd.DataFrame(data, columns=self.columns, copy=False)
+
+
+def load_columnar_table(path, columns=None, mmap=True):
+    """
+    Load a columnar table as a DataFrame, optionally projecting to `columns`
+    """
+    return ColumnarTable(path, columns=columns, mmap=mmap).to_frame()
+
+
+def directory_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(path) for filename in filenames
+    )
+
+
+def convert_csv_dataset(dataset_dir):
+    """
+    Convert participants.csv / vbt_measurements.csv of an existing dataset
+    """
+    participants_df = pd.read_csv(os.path.join(dataset_dir, "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(dataset_dir, "vbt_measurements.csv"),
+                                  parse_dates=["session_date"])
+    write_columnar_table(participants_df, os.path.join(dataset_dir, "participants" + TABLE_SUFFIX),
+                         PARTICIPANT_STORAGE_DTYPES)
+    write_columnar_table(measurements_df, os.path.join(dataset_dir, "vbt_measurements" + TABLE_SUFFIX),
+                         MEASUREMENT_STORAGE_DTYPES)
+
+
+def main():
+    """Convert a CSV dataset and compare load time / disk footprint"""
+    parser = argparse.ArgumentParser(description="Typed columnar storage for VBT tables")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("🗄️  VBT Columnar Storage")
+    print("=" * 50)
+
+    convert_csv_dataset(args.dataset_dir)
+
+    csv_path = os.path.join(args.dataset_dir, "vbt_measurements.csv")
+    table_path = os.path.join(args.dataset_dir, "vbt_measurements" + TABLE_SUFFIX)
+
+    def best_of(load):
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            load()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    csv_time = best_of(lambda: pd.read_csv(csv_path, parse_dates=["session_date"]))
+    columnar_time = best_of(lambda: load_columnar_table(table_path))
+    projected_time = best_of(lambda: load_columnar_table(table_path, columns=["load_percent_1rm", "mean_concentric_velocity"]))
+    csv_bytes = directory_bytes(csv_path)
+    columnar_bytes = directory_bytes(table_path)
+
+    print(f"   📄 CSV:      {csv_bytes / 1e6:8.2f} MB, load {csv_time * 1000:8.2f} ms")
+    print(f"   🗄️  Columnar: {columnar_bytes / 1e6:8.2f} MB, load {columnar_time * 1000:8.2f} ms")
+    print(f"   🎯 Projected (2 columns): {projected_time * 1000:.2f} ms")
+    print(f"   ⚡ {csv_time / columnar_time:.0f}x faster load, {csv_bytes / columnar_bytes:.1f}x smaller on disk")
+
+
+if __name__ == "__main__":
+    main()
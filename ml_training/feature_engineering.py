@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Vectorized Feature Engineering Stage
+Implements create_ml_training_protocol()["feature_engineering"] as whole-column operations,
+with a content-addressed, memory-mapped float32 feature cache
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from real_data_collection_protocol import EXERCISES, VELOCITY_LOAD_EQUATIONS
+
+FEATURE_VERSION = 1
+DEFAULT_CACHE_DIR = "feature_cache"
+
+SET_KEYS = ["participant_id", "exercise", "load_percent_1rm"]
+
+# Model input contract: the 8-element input_features vector of sample_predictions.json
+MODEL_INPUT_FEATURES = [
+    "mean_concentric_velocity",   # m/s
+    "peak_velocity",              # m/s
+    "relative_power",             # mean_power / body_mass, W/kg
+    "range_of_motion",            # m
+    "duration_concentric",        # s
+    "load_kg",
+    "velocity_retention",         # rep velocity / first-rep velocity of the set
+    "set_velocity_cv",            # within-set coefficient of variation of velocity
+]
+
+# Feature groups, named after the protocol's feature_engineering entries
+FEATURE_GROUPS = {
+    "model_inputs": MODEL_INPUT_FEATURES,
+    "base": ["load_kg", "load_percent_1rm", "rep_number", "age", "body_mass", "height",
+             "training_experience"] + [f"exercise_{exercise}" for exercise in EXERCISES],
+    "anthropometric_normalization": ["relative_load", "height_normalized_velocity", "rom_per_height"],
+    "exercise_specific_scaling": ["load_fraction_1rm", "velocity_vs_expected"],
+    "velocity_profiles": ["velocity_loss", "set_velocity_slope"],
+    "fatigue_indices": ["set_fatigue_index", "cumulative_velocity_loss"],
+    "load_x_experience": ["load_x_experience"],
+    "anthropometry_x_exercise": [f"body_mass_x_{exercise}" for exercise in EXERCISES],
+}
+
+MODEL_INPUT_CONFIG = {"groups": ["model_inputs"]}
+
+
+def protocol_feature_config(feature_engineering):
+    """Feature config for create_ml_training_protocol()["feature_engineering"]"""
+    groups = ["base"]
+    if feature_engineering.get("anthropometric_normalization"):
+        groups.append("anthropometric_normalization")
+    if feature_engineering.get("exercise_specific_scaling"):
+        groups.append("exercise_specific_scaling")
+    groups += feature_engineering.get("temporal_features", [])
+    groups += feature_engineering.get("interaction_terms", [])
+    return {"groups": groups}
+
+
+def feature_columns(config):
+    columns = []
+    for group in config["groups"]:
+        for column in FEATURE_GROUPS[group]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def _set_statistics(measurements_df, velocity):
+    """
+    Per-row statistics of each row's set (participant / exercise / load), ordered by
+    rep_number. Sets are found by factorizing the keys and sorting once; every
+    statistic is a bincount, a gather at set boundaries or a segmented accumulate.
+    """
+    set_codes, _ = pd.MultiIndex.from_arrays(
+        [measurements_df[key].astype(str).to_numpy() for key in SET_KEYS]
+    ).factorize()
+    rep = measurements_df["rep_number"].to_numpy(dtype=np.float64)
+    n_sets = set_codes.max() + 1 if len(set_codes) else 0
+
+    order = np.lexsort((rep, set_codes))
+    sorted_codes = set_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+    first = np.empty(n_sets)
+    last = np.empty(n_sets)
+    first[sorted_codes[starts]] = velocity[order[starts]]
+    last[sorted_codes[starts]] = velocity[order[ends - 1]]
+
+    count = np.bincount(set_codes, minlength=n_sets).astype(np.float64)
+    mean = np.bincount(set_codes, velocity, n_sets) / count
+    deviation = velocity - mean[set_codes]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = np.sqrt(np.bincount(set_codes, deviation ** 2, n_sets) / (count - 1))
+    std[count < 2] = 0.0
+
+    # Least-squares slope of velocity against rep_number within each set
+    rep_mean = np.bincount(set_codes, rep, n_sets) / count
+    rep_deviation = rep - rep_mean[set_codes]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.bincount(set_codes, rep_deviation * deviation, n_sets) / \
+            np.bincount(set_codes, rep_deviation ** 2, n_sets)
+    slope[~np.isfinite(slope)] = 0.0
+
+    # Best velocity so far in the set: running max over the sorted rows, restarted per set
+    # by lifting each set above every earlier one
+    offset = np.nanmax(np.abs(velocity)) * 2 + 1 if len(velocity) else 0
+    lifted = velocity[order] + sorted_codes * offset
+    running_best = np.empty_like(velocity)
+    running_best[order] = np.fmax.accumulate(lifted) - sorted_codes * offset
+
+    return {
+        "first": first[set_codes], "last": last[set_codes], "mean": mean[set_codes],
+        "std": std[set_codes], "slope": slope[set_codes], "running_best": running_best
+    }
+
+
+def compute_features(measurements_df, participants_df, config=MODEL_INPUT_CONFIG):
+    """Feature matrix (float32, rows aligned with measurements_df) and its column names"""
+    columns = feature_columns(config)
+    participants = participants_df.set_index(participants_df["participant_id"].astype(str))
+    participant_ids = measurements_df["participant_id"].astype(str)
+
+    def participant_column(name):
+        return participant_ids.map(participants[name]).to_numpy(dtype=np.float64)
+
+    def measurement_column(name):
+        return measurements_df[name].to_numpy(dtype=np.float64)
+
+    velocity = measurement_column("mean_concentric_velocity")
+    exercise = measurements_df["exercise"].astype(str).to_numpy()
+    cache = {}
+
+    def get(name):
+        if name not in cache:
+            cache[name] = _feature(name)
+        return cache[name]
+
+    def set_stat(name):
+        if "_sets" not in cache:
+            cache["_sets"] = _set_statistics(measurements_df, velocity)
+        return cache["_sets"][name]
+
+    def _feature(name):
+        if name in ("age", "body_mass", "height", "training_experience"):
+            return participant_column(name)
+        if name.startswith("exercise_"):
+            return (exercise == name[len("exercise_"):]).astype(np.float64)
+        if name.startswith("body_mass_x_"):
+            return get("body_mass") * get(f"exercise_{name[len('body_mass_x_'):]}")
+        if name == "relative_power":
+            return measurement_column("mean_power") / get("body_mass")
+        if name == "velocity_retention":
+            return velocity / set_stat("first")
+        if name == "set_velocity_cv":
+            return set_stat("std") / set_stat("mean")
+        if name == "relative_load":
+            return get("load_kg") / get("body_mass")
+        if name == "height_normalized_velocity":
+            return velocity / np.sqrt(9.80665 * get("height") / 100)  # Froude-style, height in cm
+        if name == "rom_per_height":
+            return get("range_of_motion") / (get("height") / 100)
+        if name == "load_fraction_1rm":
+            return get("load_percent_1rm") / 100
+        if name == "velocity_vs_expected":
+            intercept = pd.Series(exercise).map({e: v[0] for e, v in VELOCITY_LOAD_EQUATIONS.items()})
+            slope = pd.Series(exercise).map({e: v[1] for e, v in VELOCITY_LOAD_EQUATIONS.items()})
+            return velocity / (intercept.to_numpy(np.float64) - slope.to_numpy(np.float64) * get("load_percent_1rm"))
+        if name == "velocity_loss":
+            return 1 - get("velocity_retention")
+        if name == "set_velocity_slope":
+            return set_stat("slope")
+        if name == "set_fatigue_index":
+            return (set_stat("first") - set_stat("last")) / set_stat("first")
+        if name == "cumulative_velocity_loss":
+            return np.maximum(0.0, 1 - velocity / set_stat("running_best"))
+        if name == "load_x_experience":
+            return get("load_fraction_1rm") * get("training_experience")
+        return measurement_column(name)
+
+    features = np.empty((len(measurements_df), len(columns)), dtype=np.float32)
+    for i, name in enumerate(columns):
+        features[:, i] = get(name)
+    return features, columns
+
+
+# ---------------------------------------------------------------------------
+# Content-addressed cache
+# ---------------------------------------------------------------------------
+
+def _hash_column(digest, series):
+    """
+    Hash a column's values in a load-independent form: numbers as float32 (the
+    precision of columnar storage and of the feature matrix), timestamps as
+    int64 nanoseconds whether they arrive parsed or as ISO strings, anything
+    else as strings
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype) or not (
+            pd.api.types.is_numeric_dtype(series) or pd.api.types.is_datetime64_any_dtype(series)):
+        try:
+            series = pd.to_datetime(series.astype(str), format="ISO8601")
+        except (ValueError, TypeError):
+            digest.update(b"s")
+            digest.update(pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy().tobytes())
+            return
+    if pd.api.types.is_datetime64_any_dtype(series):
+        digest.update(b"t")
+        digest.update(np.ascontiguousarray(series.to_numpy().astype("datetime64[ns]").view(np.int64)).tobytes())
+    else:
+        digest.update(b"f")
+        digest.update(np.ascontiguousarray(series.to_numpy(dtype=np.float32)).tobytes())
+
+
+def feature_cache_key(measurements_df, participants_df, config):
+    """
+    sha256 over the feature config and the content of every input column,
+    normalized by _hash_column so CSV, Parquet and columnar loads of the same
+    data agree
+    """
+    digest = hashlib.sha256(json.dumps({"version": FEATURE_VERSION, "config": config},
+                                       sort_keys=True).encode())
+    for table in (measurements_df, participants_df):
+        for name in sorted(table.columns):
+            digest.update(name.encode())
+            _hash_column(digest, table[name])
+    return digest.hexdigest()
+
+
+def build_feature_matrix(measurements_df, participants_df, config=MODEL_INPUT_CONFIG, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Cached compute_features(): the matrix is stored as <cache_dir>/<key>.npy and
+    returned memory-mapped (read-only); cache_dir=None disables the cache
+    """
+    if cache_dir is None:
+        return compute_features(measurements_df, participants_df, config)
+
+    key = feature_cache_key(measurements_df, participants_df, config)
+    path = os.path.join(cache_dir, f"{key}.npy")
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            return np.load(path, mmap_mode="r"), json.load(f)["columns"]
+
+    features, columns = compute_features(measurements_df, participants_df, config)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Metadata first, both via tmp + rename: a reader that sees the .npy always finds complete metadata
+    tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta_path, 'w') as f:
+        json.dump({"columns": columns, "config": config, "rows": len(features),
+                   "version": FEATURE_VERSION}, f, indent=2)
+    os.replace(tmp_meta_path, meta_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, features)
+    os.replace(tmp_path, path)
+    return np.load(path, mmap_mode="r"), columns
+
+
+def build_input_features(measurements_df, participants_df, cache_dir=None):
+    """
+    Model input matrix (float32, n x 8) from measurement and participant rows
+    """
+    features, _ = build_feature_matrix(measurements_df, participants_df, MODEL_INPUT_CONFIG, cache_dir)
+    return features
+
+
+def main():
+    """Build the protocol feature matrix for a dataset and show cache reuse"""
+    from real_data_collection_protocol import AcademicVBTDataCollector
+
+    parser = argparse.ArgumentParser(description="Vectorized feature engineering stage")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    print("🧮 Feature Engineering Stage")
+    print("=" * 50)
+
+    participants_df = pd.read_csv(os.path.join(args.dataset_dir, "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+    protocol = AcademicVBTDataCollector().create_ml_training_protocol()
+    config = protocol_feature_config(protocol["feature_engineering"])
+
+    start = time.perf_counter()
+    compute_features(measurements_df, participants_df, config)
+    compute_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    features, columns = build_feature_matrix(measurements_df, participants_df, config, args.cache_dir)
+    first_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_feature_matrix(measurements_df, participants_df, config, args.cache_dir)
+    cached_seconds = time.perf_counter() - start
+
+    print(f"✅ {features.shape[0]} rows x {features.shape[1]} features ({', '.join(config['groups'])})")
+    print(f"   🧮 Compute: {compute_seconds * 1000:.1f} ms, first build (compute + store): "
+          f"{first_seconds * 1000:.1f} ms, cached load: {cached_seconds * 1000:.1f} ms")
+    print(f"   📁 Cache: {args.cache_dir}/")
+
+
+if __name__ == "__main__":
+    main()
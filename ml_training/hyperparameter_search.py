@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Budgeted Hyperparameter Search
+Successive halving over participant-grouped folds with an on-disk fold-result cache
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from participant_cross_validation import (
+    DEFAULT_FEATURES, DEFAULT_TARGET, SharedArrays, attach_shared_arrays, build_cv_matrix,
+    detach_shared_arrays, make_model, participant_folds, worker_arrays
+)
+from feature_engineering import protocol_feature_config
+from real_data_collection_protocol import AcademicVBTDataCollector
+
+# Discrete search spaces per protocol model family (neural_networks covers the
+# MLPRegressor behind fatigue_model.pkl)
+SEARCH_SPACES = {
+    "linear_regression": {
+        "fit_intercept": [True, False],
+    },
+    "random_forest": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 4, 8, 16],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "gradient_boosting": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_depth": [2, 3, 4],
+        "subsample": [0.7, 1.0],
+    },
+    "neural_networks": {
+        "hidden_layer_sizes": [(32,), (64, 32), (128, 64)],
+        "alpha": [1e-5, 1e-4, 1e-3, 1e-2],
+        "learning_rate_init": [1e-3, 3e-3, 1e-2],
+    },
+}
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+
+
+def dataset_fingerprint(X, y, groups):
+    """Content hash of the CV inputs; any change to the data invalidates cached folds"""
+    digest = hashlib.sha256()
+    for array in (X, y, groups):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class FoldResultCache:
+    """
+    Append-only JSONL store of per-fold scores keyed by a hash of
+    dataset, features, model, parameters and fold
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        self.hits = 0
+        self.misses = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        self.results[record["key"]] = record
+
+    @staticmethod
+    def key(dataset_hash, features, model, params, n_folds, fold):
+        payload = _canonical({"dataset": dataset_hash, "features": features, "model": model,
+                              "params": params, "n_folds": n_folds, "fold": fold})
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        record = self.results.get(key)
+        if record is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return record
+
+    def put(self, key, record):
+        record = dict(record, key=key)
+        self.results[key] = record
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+
+def sample_candidates(models, n_candidates, seed=42):
+    """
+    Distinct random (model, params) configurations, shared evenly across model
+    families; quota a small space cannot fill goes to the remaining families
+    """
+    rng = np.random.default_rng(seed)
+    grids = {}
+    for model in models:
+        names = list(SEARCH_SPACES[model])
+        combinations = list(itertools.product(*(SEARCH_SPACES[model][name] for name in names)))
+        grids[model] = [dict(zip(names, combinations[i])) for i in rng.permutation(len(combinations))]
+
+    quota = dict.fromkeys(models, 0)
+    remaining = min(n_candidates, sum(len(grid) for grid in grids.values()))
+    while remaining:
+        open_models = [model for model in models if quota[model] < len(grids[model])]
+        for model in open_models[:remaining]:
+            quota[model] += 1
+            remaining -= 1
+    return [(model, params) for model in models for params in grids[model][:quota[model]]]
+
+
+def _score_fold(model, params, fold):
+    """Fit on every other fold, return (sum of squared errors, n, fit seconds) on `fold`"""
+    X = worker_arrays["X"]
+    y = worker_arrays["y"]
+    validation = worker_arrays["fold_ids"] == fold
+    start = time.perf_counter()
+    estimator = make_model(model, params).fit(X[~validation], y[~validation])
+    residual = estimator.predict(X[validation]) - y[validation]
+    return float((residual ** 2).sum()), int(validation.sum()), time.perf_counter() - start
+
+
+def successive_halving(X, y, groups, models, n_candidates=27, n_folds=5, eta=3, min_folds=1,
+                       time_budget=None, max_fits=None, cache_path=None, features=None,
+                       n_workers=None, seed=42):
+    """
+    Score every candidate on `min_folds` folds, keep the best 1/eta and grow the
+    fold count by eta until survivors are scored on all folds. Stops early when the
+    wall-clock (seconds) or fit budget runs out and returns the best fully-ranked rung.
+    """
+    deadline = time.perf_counter() + time_budget if time_budget else None
+    cache = FoldResultCache(cache_path)
+    dataset_hash = dataset_fingerprint(X, y, groups)
+    candidates = sample_candidates(list(models), n_candidates, seed)
+    scores = {index: {} for index in range(len(candidates))}  # candidate -> fold -> (sse, n)
+    fits = 0
+    rungs = []
+    budget_exhausted = False
+
+    def budget_left():
+        if deadline is not None and time.perf_counter() >= deadline:
+            return False
+        return max_fits is None or fits < max_fits
+
+    def run_rung(survivors, folds, submit, collect):
+        nonlocal fits, budget_exhausted
+        pending = {}
+        for index in survivors:
+            model, params = candidates[index]
+            for fold in range(folds):
+                if fold in scores[index]:
+                    continue
+                key = FoldResultCache.key(dataset_hash, features, model, params, n_folds, fold)
+                record = cache.get(key)
+                if record is not None:
+                    scores[index][fold] = (record["sse"], record["n"])
+                else:
+                    pending[(index, fold)] = key
+
+        for (index, fold), result in collect(submit(pending)):
+            sse, n, seconds = result
+            model, params = candidates[index]
+            scores[index][fold] = (sse, n)
+            cache.put(pending[(index, fold)], {"model": model, "params": params, "fold": fold,
+                                               "n_folds": n_folds, "sse": sse, "n": n, "fit_seconds": seconds})
+            fits += 1
+        budget_exhausted = any(len(scores[index]) < folds for index in survivors)
+
+    def rung_rmse(index, folds):
+        sse, n = np.sum([scores[index][fold] for fold in range(folds)], axis=0)
+        return float(math.sqrt(sse / n))
+
+    shared = SharedArrays(X=np.asarray(X, dtype=np.float64), y=np.asarray(y, dtype=np.float64),
+                          fold_ids=participant_folds(np.asarray(groups), n_folds).astype(np.int32))
+    n_workers = n_workers or os.cpu_count()
+    pool = None
+    try:
+        if n_workers == 1:
+            attach_shared_arrays(shared.spec)
+
+            def submit(pending):
+                return pending
+
+            def collect(pending):
+                for index, fold in pending:
+                    if not budget_left():
+                        return
+                    model, params = candidates[index]
+                    yield (index, fold), _score_fold(model, params, fold)
+        else:
+            pool = ProcessPoolExecutor(max_workers=n_workers, initializer=attach_shared_arrays,
+                                       initargs=(shared.spec,))
+
+            def submit(pending):
+                queue = iter(pending)
+                futures = {}
+
+                def top_up():
+                    # Keep only a few tasks per worker in flight so a budget stop wastes little work
+                    for index, fold in queue:
+                        model, params = candidates[index]
+                        futures[pool.submit(_score_fold, model, params, fold)] = (index, fold)
+                        if len(futures) >= 2 * n_workers:
+                            break
+                return futures, top_up
+
+            def collect(submitted):
+                futures, top_up = submitted
+                top_up()
+                while futures and budget_left():
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield futures.pop(future), future.result()
+                    top_up()
+                for future in futures:
+                    future.cancel()
+
+        survivors = list(range(len(candidates)))
+        folds = min(min_folds, n_folds)
+        while True:
+            run_rung(survivors, folds, submit, collect)
+            if budget_exhausted:
+                break
+            ranked = sorted(survivors, key=lambda index: rung_rmse(index, folds))
+            rungs.append({"folds": folds, "n_candidates": len(ranked),
+                          "ranking": [(index, rung_rmse(index, folds)) for index in ranked]})
+            if folds == n_folds:
+                break
+            survivors = ranked[:max(1, len(ranked) // eta)]
+            folds = n_folds if len(survivors) == 1 else min(folds * eta, n_folds)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        else:
+            detach_shared_arrays()
+        shared.close()
+
+    if not rungs:
+        raise RuntimeError(f"Budget exhausted before the first rung completed: it needs "
+                           f"{len(candidates) * min(min_folds, n_folds)} fold scores, {fits} were fitted "
+                           f"and {cache.hits} came from the cache")
+
+    final = rungs[-1]
+    best_index, best_rmse = final["ranking"][0]
+    model, params = candidates[best_index]
+    return {
+        "best": {"model": model, "params": params, "rmse": best_rmse, "folds": final["folds"]},
+        "complete": final["folds"] == n_folds and not budget_exhausted,
+        "n_candidates": len(candidates),
+        "n_folds": n_folds,
+        "eta": eta,
+        "fits": fits,
+        "cache_hits": cache.hits,
+        "cache_misses": cache.misses,
+        "rungs": [
+            {"folds": rung["folds"], "n_candidates": rung["n_candidates"],
+             "ranking": [{"model": candidates[index][0], "params": candidates[index][1], "rmse": rmse}
+                         for index, rmse in rung["ranking"]]}
+            for rung in rungs
+        ]
+    }
+
+
+def main():
+    """Search the protocol's model families under a budget"""
+    protocol = AcademicVBTDataCollector().create_ml_training_protocol()
+    selection = protocol["model_selection"]
+
+    parser = argparse.ArgumentParser(description="Budgeted successive-halving hyperparameter search")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--target", default=DEFAULT_TARGET)
+    parser.add_argument("--models", default=",".join(selection["baseline_models"] + selection["advanced_models"]))
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--time-budget", type=float, default=None, help="wall-clock seconds")
+    parser.add_argument("--max-fits", type=int, default=None)
+    parser.add_argument("--cache", default="search_cache/fold_results.jsonl")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--feature-cache", default=None, help="reuse protocol features from this directory")
+    args = parser.parse_args()
+
+    print("🔍 Budgeted Hyperparameter Search")
+    print("=" * 50)
+
+    participants_df = pd.read_csv(os.path.join(args.dataset_dir, "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+    X, y, groups, _ = build_cv_matrix(measurements_df, participants_df, args.target,
+                                      feature_config=protocol_feature_config(protocol["feature_engineering"]),
+                                      cache_dir=args.feature_cache)
+    features = {"target": args.target, "columns": DEFAULT_FEATURES}
+
+    start = time.perf_counter()
+    try:
+        result = successive_halving(
+            X, y, groups, args.models.split(","), n_candidates=args.candidates,
+            n_folds=protocol["cross_validation"]["inner_cv_folds"], eta=args.eta,
+            time_budget=args.time_budget, max_fits=args.max_fits, cache_path=args.cache,
+            features=features, n_workers=args.workers, seed=args.seed
+        )
+    except RuntimeError as error:
+        print(f"❌ {error}")
+        print("   Raise --max-fits / --time-budget or lower --candidates")
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    best = result["best"]
+    print(f"✅ {result['n_candidates']} candidates, {len(result['rungs'])} rungs in {elapsed:.1f} s"
+          f"{'' if result['complete'] else ' (budget exhausted)'}")
+    for rung in result["rungs"]:
+        print(f"   🪜 {rung['n_candidates']:>3} candidates on {rung['folds']} folds, "
+              f"best RMSE {rung['ranking'][0]['rmse']:.4f}")
+    print(f"   🏆 {best['model']} {best['params']} RMSE {best['rmse']:.4f} ({best['folds']} folds)")
+    print(f"   💾 Cache: {result['cache_hits']} hits, {result['fits']} new fits")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+        print(f"   📁 Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
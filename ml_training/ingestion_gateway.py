@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+asyncio Multi-Device Ingestion Gateway
+Accepts many ESP32-style velocity / force / displacement streams over a local socket,
+micro-batches the samples and hands the batches to analysis and storage stages
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from streaming_rep_engine import GRAVITY, StreamingRepEngine, simulate_set_signal
+
+CHANNELS = ("velocity", "force", "displacement")
+DEFAULT_SOCKET = "/tmp/vbt_gateway.sock"
+
+# A device stream is one JSON hello line followed by one "velocity,force,displacement"
+# line per notification, formatted like the firmware (String(value, 4/3/4)).
+# A line "@<CLOCK_MONOTONIC ns>" may precede a write so the gateway can measure latency.
+Batch = namedtuple("Batch", "device_id samples sent_ns received_ns")
+
+
+def _split_timestamps(lines):
+    """Remove "@<ns>" lines from a block of complete lines; returns (lines, first stamp or None)"""
+    position = lines.find(b"@")
+    if position < 0:
+        return lines, None
+    first_stamp = None
+    parts = []
+    start = 0
+    while position >= 0:
+        end = lines.index(b"\n", position)
+        if first_stamp is None:
+            first_stamp = int(lines[position + 1:end])
+        parts.append(lines[start:position])
+        start = end + 1
+        position = lines.find(b"@", start)
+    parts.append(lines[start:])
+    return b"".join(parts), first_stamp
+
+
+def parse_samples(lines):
+    """Complete "v,f,d\\n" lines -> (n, 3) float64 array, parsed in one call"""
+    if not lines:
+        return np.empty((0, len(CHANNELS)))
+    fields = lines[:-1].replace(b"\n", b",").split(b",")
+    if len(fields) % len(CHANNELS):
+        raise ValueError("Malformed sample line")
+    values = np.fromiter(map(float, fields), dtype=np.float64, count=len(fields))
+    return values.reshape(-1, len(CHANNELS))
+
+
+def _parse_lines_leniently(lines):
+    """
+    Slow path for a block that failed to parse: keeps every valid sample line and
+    the first valid stamp, drops the rest. Returns (samples, first stamp or None, rejected lines)
+    """
+    rows = []
+    first_stamp = None
+    rejected = 0
+    for line in lines.splitlines():
+        try:
+            if line.startswith(b"@"):
+                stamp = int(line[1:])
+                if first_stamp is None:
+                    first_stamp = stamp
+                continue
+            values = tuple(map(float, line.split(b",")))
+            if len(values) != len(CHANNELS):
+                raise ValueError("Malformed sample line")
+        except ValueError:
+            rejected += 1
+            continue
+        rows.append(values)
+    return np.array(rows, dtype=np.float64).reshape(-1, len(CHANNELS)), first_stamp, rejected
+
+
+class _DeviceBuffer:
+    __slots__ = ("parts", "n_samples", "sent_ns", "received_ns")
+
+    def __init__(self):
+        self.parts = []
+        self.n_samples = 0
+        self.sent_ns = None
+        self.received_ns = None
+
+
+class RepAnalysisStage:
+    """Feeds each device's batches through the streaming rep engine"""
+
+    def __init__(self, **stream_defaults):
+        self.engine = StreamingRepEngine(**stream_defaults)
+        self.rows = []
+
+    def open(self, device_id, hello):
+        self.engine.open_stream(device_id, hello.get("participant_id", device_id), hello.get("exercise"),
+                                hello.get("load_kg"), hello.get("load_percent_1rm"),
+                                sampling_rate=hello.get("sampling_rate", 1000))
+
+    def process(self, batch):
+        samples = batch.samples
+        self.rows += self.engine.push(batch.device_id, samples[:, 0], samples[:, 1], samples[:, 2])
+
+    def close(self, device_id):
+        self.rows += self.engine.close_stream(device_id)
+
+
+class RawSampleStorageStage:
+    """Appends each device's samples as float32 (n, 3) records to <output_dir>/<device_id>.f32"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.files = {}
+        os.makedirs(output_dir, exist_ok=True)
+
+    def open(self, device_id, hello):
+        self.files[device_id] = open(os.path.join(self.output_dir, f"{device_id}.f32"), 'ab')
+
+    def process(self, batch):
+        self.files[batch.device_id].write(batch.samples.astype(np.float32).tobytes())
+
+    def close(self, device_id):
+        self.files.pop(device_id).close()
+
+
+class IngestionGateway:
+    """
+    One reader task per device connection and a single consumer task that runs
+    the stages. Batches go through a bounded queue: when the stages fall behind,
+    queue.put() blocks the reader, the socket buffer fills and the device's
+    drain() blocks, so backpressure reaches the sender instead of growing memory.
+    """
+
+    def __init__(self, stages, batch_samples=250, batch_interval=0.05, queue_size=64):
+        self.stages = stages
+        self.batch_samples = batch_samples
+        self.batch_interval = batch_interval
+        self.queue_size = queue_size
+        self.buffers = {}
+        self.stats = {"devices": 0, "samples": 0, "batches": 0, "max_queue_depth": 0,
+                      "blocked_puts": 0, "malformed_chunks": 0,
+                      "malformed_lines": 0}
+        self.latencies_ns = []
+        self.first_received_ns = None
+        self.last_received_ns = None
+        self._server = None
+        self._tasks = []
+
+    async def start(self, path=DEFAULT_SOCKET, host=None, port=None):
+        self.queue = asyncio.Queue(self.queue_size)
+        if port is not None:
+            self._server = await asyncio.start_server(self._handle_device, host or "127.0.0.1", port)
+        else:
+            if os.path.exists(path):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._handle_device, path)
+        self._tasks = [asyncio.create_task(self._consume()), asyncio.create_task(self._flush_stale())]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+
+    async def _put(self, item):
+        if self.queue.full():
+            self.stats["blocked_puts"] += 1
+        await self.queue.put(item)
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue.qsize())
+
+    async def _emit(self, device_id):
+        buffer = self.buffers.get(device_id)
+        if buffer is None or not buffer.n_samples:
+            return
+        samples = buffer.parts[0] if len(buffer.parts) == 1 else np.concatenate(buffer.parts)
+        batch = Batch(device_id, samples, buffer.sent_ns, buffer.received_ns)
+        self.buffers[device_id] = _DeviceBuffer()
+        await self._put(batch)
+
+    async def _handle_device(self, reader, writer):
+        hello = json.loads(await reader.readline())
+        device_id = str(hello["device_id"])
+        self.stats["devices"] += 1
+        for stage in self.stages:
+            stage.open(device_id, hello)
+        self.buffers[device_id] = _DeviceBuffer()
+
+        pending = b""
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                data = pending + data
+                cut = data.rfind(b"\n") + 1
+                block, pending = data[:cut], data[cut:]
+                try:
+                    lines, sent_ns = _split_timestamps(block)
+                    samples = parse_samples(lines)
+                except ValueError:
+                    samples, sent_ns, rejected = _parse_lines_leniently(block)
+                    self.stats["malformed_chunks"] += 1
+                    self.stats["malformed_lines"] += rejected
+                if not len(samples):
+                    continue
+
+                now = time.monotonic_ns()
+                if self.first_received_ns is None:
+                    self.first_received_ns = now
+                self.last_received_ns = now
+                buffer = self.buffers[device_id]
+                if not buffer.n_samples:
+                    buffer.received_ns = now
+                    buffer.sent_ns = sent_ns
+                elif buffer.sent_ns is None:
+                    buffer.sent_ns = sent_ns
+                buffer.parts.append(samples)
+                buffer.n_samples += len(samples)
+                self.stats["samples"] += len(samples)
+                if buffer.n_samples >= self.batch_samples:
+                    await self._emit(device_id)
+        finally:
+            await self._emit(device_id)
+            del self.buffers[device_id]
+            await self._put(Batch(device_id, None, None, None))  # End-of-stream marker
+            writer.close()
+
+    async def _flush_stale(self):
+        """Emit partial batches older than batch_interval (slow or idle devices)"""
+        while True:
+            await asyncio.sleep(self.batch_interval / 2)
+            deadline = time.monotonic_ns() - int(self.batch_interval * 1e9)
+            for device_id, buffer in list(self.buffers.items()):
+                if buffer.n_samples and buffer.received_ns < deadline:
+                    await self._emit(device_id)
+
+    async def _consume(self):
+        while True:
+            batch = await self.queue.get()
+            try:
+                if batch.samples is None:
+                    for stage in self.stages:
+                        stage.close(batch.device_id)
+                else:
+                    for stage in self.stages:
+                        stage.process(batch)
+                    self.stats["batches"] += 1
+                    if batch.sent_ns is not None:
+                        self.latencies_ns.append(time.monotonic_ns() - batch.sent_ns)
+            finally:
+                self.queue.task_done()
+
+    def latency_summary(self):
+        if not self.latencies_ns:
+            return {}
+        latencies = np.asarray(self.latencies_ns) / 1e6
+        return {f"p{q}_ms": float(np.percentile(latencies, q)) for q in (50, 95, 99)} | \
+            {"max_ms": float(latencies.max())}
+
+
+# ---------------------------------------------------------------------------
+# Simulated devices
+# ---------------------------------------------------------------------------
+
+def encode_samples(velocity, force, displacement):
+    """Firmware-formatted lines for a whole signal, plus the byte offset of every line"""
+    lines = [f"{v:.4f},{f:.3f},{d:.4f}\n".encode("ascii") for v, f, d in zip(velocity, force, displacement)]
+    offsets = np.concatenate([[0], np.cumsum([len(line) for line in lines])])
+    return b"".join(lines), offsets
+
+
+def device_signals(n_devices, reps_per_set=5, traces_path=None, seed=0):
+    """
+    Per-device ((velocity, force, displacement), load_kg): simulated sets, or
+    rows of a rep_traces/ directory replayed with a 0.5 s rest between reps
+    """
+    rng = np.random.default_rng(seed)
+    signals = []
+    if traces_path:
+        from raw_signal_synthesis import RepTraceStore
+        store = RepTraceStore(traces_path)
+        rest = np.zeros((3, store.sampling_rate // 2), dtype=np.float32)
+        for device in range(n_devices):
+            rows = [(device * reps_per_set + rep) % len(store) for rep in range(reps_per_set)]
+            signal = np.concatenate([part for row in rows for part in (rest, store.trace(row))] + [rest], axis=1)
+            # Traces do not store the load; force is load * (g + a) and a averages to zero over a rep
+            load_kg = float(np.median([store.channel(row, "force").mean() for row in rows]) / GRAVITY)
+            signals.append((tuple(signal), round(load_kg, 1)))
+    else:
+        for device in range(n_devices):
+            load_kg = rng.uniform(40, 180)
+            signals.append((simulate_set_signal(rng, load_kg, rng.uniform(0.3, 1.0, reps_per_set)), load_kg))
+    return signals
+
+
+async def _run_device(device_id, encoded, load_kg, connect, rate_hz, duration, tick):
+    data, offsets = encoded
+    n_lines = len(offsets) - 1
+    reader, writer = await connect()
+    hello = {"device_id": device_id, "participant_id": device_id, "exercise": "squat",
+             "load_kg": load_kg, "load_percent_1rm": 70, "sampling_rate": rate_hz}
+    writer.write(json.dumps(hello).encode() + b"\n")
+
+    per_tick = max(1, int(rate_hz * tick))
+    position = 0
+    sent = 0
+    start = time.monotonic()
+    while time.monotonic() - start < duration:
+        # Replay the signal cyclically, like the ESP32's 10 ms ticker
+        end = position + per_tick
+        if end <= n_lines:
+            chunk = data[offsets[position]:offsets[end]]
+        else:
+            end -= n_lines
+            chunk = data[offsets[position]:] + data[:offsets[end]]
+        writer.write(b"@%d\n" % time.monotonic_ns() + chunk)
+        await writer.drain()  # Blocks while the gateway applies backpressure
+        position = end
+        sent += per_tick
+        next_tick = start + sent / rate_hz
+        await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+
+    writer.close()
+    await writer.wait_closed()
+    return sent
+
+
+async def simulate_devices(n_devices, rate_hz=1000, duration=10.0, path=DEFAULT_SOCKET, host=None,
+                           port=None, tick=0.01, traces_path=None, seed=0):
+    """Replay generated traces as N concurrent fake devices; returns samples sent"""
+    if port is not None:
+        async def connect():
+            return await asyncio.open_connection(host or "127.0.0.1", port)
+    else:
+        async def connect():
+            return await asyncio.open_unix_connection(path)
+
+    signals = device_signals(n_devices, traces_path=traces_path, seed=seed)
+    sent = await asyncio.gather(*(
+        _run_device(f"device-{index:03d}", encode_samples(*signal), load_kg, connect, rate_hz, duration, tick)
+        for index, (signal, load_kg) in enumerate(signals)
+    ))
+    return sum(sent)
+
+
+def _simulator_process(kwargs, result):
+    result.value = asyncio.run(simulate_devices(**kwargs))
+
+
+async def load_test(n_devices=50, rate_hz=1000, duration=10.0, batch_samples=250, path=DEFAULT_SOCKET,
+                    traces_path=None, storage_dir=None):
+    """Gateway in this process, simulated devices in a separate process"""
+    stages = [RepAnalysisStage()]
+    if storage_dir:
+        stages.append(RawSampleStorageStage(storage_dir))
+    gateway = await IngestionGateway(stages, batch_samples=batch_samples).start(path)
+
+    sent = multiprocessing.Value("q", 0)
+    simulator = multiprocessing.Process(target=_simulator_process, args=(
+        {"n_devices": n_devices, "rate_hz": rate_hz, "duration": duration, "path": path,
+         "traces_path": traces_path}, sent))
+    start = time.perf_counter()
+    simulator.start()
+    while simulator.is_alive():
+        await asyncio.sleep(0.1)
+    # Let the last connections drain through the stages
+    while gateway.stats["devices"] and gateway.buffers:
+        await asyncio.sleep(0.05)
+    await gateway.stop()
+    elapsed = time.perf_counter() - start
+    ingest_seconds = (gateway.last_received_ns - gateway.first_received_ns) / 1e9
+
+    return {
+        "devices": n_devices,
+        "rate_hz": rate_hz,
+        "seconds": elapsed,
+        "samples_sent": sent.value,
+        "samples_ingested": gateway.stats["samples"],
+        "samples_per_second": gateway.stats["samples"] / ingest_seconds,
+        "batches": gateway.stats["batches"],
+        "max_queue_depth": gateway.stats["max_queue_depth"],
+        "blocked_puts": gateway.stats["blocked_puts"],
+        "reps_detected": len(stages[0].rows),
+        "latency": gateway.latency_summary()
+    }
+
+
+def main():
+    """Run the gateway, the device simulator, or both as a load test"""
+    parser = argparse.ArgumentParser(description="asyncio multi-device ingestion gateway")
+    parser.add_argument("mode", choices=["loadtest", "serve", "simulate"], nargs="?", default="loadtest")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=1000, help="samples per second per device")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-samples", type=int, default=250)
+    parser.add_argument("--traces", default=None, help="replay a rep_traces/ directory")
+    parser.add_argument("--storage-dir", default=None, help="also store raw samples here")
+    args = parser.parse_args()
+
+    print("🛰️  VBT Ingestion Gateway")
+    print("=" * 50)
+
+    if args.mode == "simulate":
+        sent = asyncio.run(simulate_devices(args.devices, args.rate, args.duration, args.socket,
+                                            traces_path=args.traces))
+        print(f"✅ {args.devices} devices sent {sent:,} samples")
+        return
+
+    if args.mode == "serve":
+        async def serve():
+            stages = [RepAnalysisStage()]
+            if args.storage_dir:
+                stages.append(RawSampleStorageStage(args.storage_dir))
+            gateway = await IngestionGateway(stages, batch_samples=args.batch_samples).start(args.socket)
+            print(f"👂 Listening on {args.socket}")
+            while True:
+                await asyncio.sleep(5)
+                print(f"   📥 {gateway.stats['samples']:,} samples, {gateway.stats['batches']:,} batches, "
+                      f"{len(stages[0].rows)} reps")
+        asyncio.run(serve())
+        return
+
+    results = asyncio.run(load_test(args.devices, args.rate, args.duration, args.batch_samples,
+                                    args.socket, args.traces, args.storage_dir))
+    latency = results["latency"]
+    print(f"✅ {results['devices']} devices x {results['rate_hz']} Hz for {args.duration:.0f} s")
+    print(f"   📥 {results['samples_ingested']:,}/{results['samples_sent']:,} samples, "
+          f"{results['samples_per_second']:,.0f} samples/s, {results['batches']:,} batches")
+    print(f"   ⏱️ Latency p50 {latency.get('p50_ms', float('nan')):.1f} ms, "
+          f"p95 {latency.get('p95_ms', float('nan')):.1f} ms, p99 {latency.get('p99_ms', float('nan')):.1f} ms")
+    print(f"   🚦 Max queue depth {results['max_queue_depth']}, blocked puts {results['blocked_puts']}")
+    print(f"   🏋️ Reps detected: {results['reps_detected']}")
+
+
+if __name__ == "__main__":
+    main()
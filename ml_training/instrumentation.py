@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Pipeline Stage Instrumentation
+Wall / CPU time, rows, peak RSS and allocations per named stage, an opt-in
+cProfile or sampling profile of one stage, and JSON / Chrome-trace output.
+Disabled (the default), stage() returns a shared no-op context manager.
+Stages run in pool workers are recorded only for tasks submitted through
+call_recorded(); their records are merged back with add_records().
+"""
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FORMAT_NAME = "vbt-stage-profile"
+FORMAT_VERSION = 1
+PROFILERS = ("cprofile", "sampling")
+
+_recorder = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3  # bytes on macOS, KiB elsewhere
+
+
+class _DisabledStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_DISABLED = _DisabledStage()
+
+
+def stage(name, rows=None):
+    """Context manager timing one pipeline stage; free when instrumentation is off"""
+    if _recorder is None:
+        return _DISABLED
+    return _Stage(_recorder, name, rows)
+
+
+class _SamplingProfiler:
+    """Collapsed stacks of one thread, sampled from a background thread"""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self, thread_id):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        """Folded-stack text, the input format of flamegraph.pl / speedscope"""
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _Stage:
+    __slots__ = ("recorder", "name", "rows", "wall", "cpu", "blocks", "rss", "child_peak", "profiling")
+
+    def __init__(self, recorder, name, rows):
+        self.recorder = recorder
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        recorder = self.recorder
+        stack = recorder._stack()
+        self.child_peak = 0
+        if recorder.trace_allocations:
+            # Carry the enclosing stage's peak so resetting it here does not lose it
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.profiling = self.name == recorder.profile_stage and not recorder._profiling
+        if self.profiling:
+            recorder._profiling = True
+            recorder._start_profiler()
+        self.rss = _peak_rss_mb()
+        self.blocks = sys.getallocatedblocks()
+        self.cpu = time.process_time_ns()
+        self.wall = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter_ns()
+        cpu = time.process_time_ns()
+        blocks = sys.getallocatedblocks()
+        recorder = self.recorder
+        if self.profiling:
+            recorder._stop_profiler()
+            recorder._profiling = False
+        stack = recorder._stack()
+        stack.pop()
+
+        rss = _peak_rss_mb()
+        record = {
+            "name": self.name,
+            "depth": len(stack),
+            "parent": stack[-1].name if stack else None,
+            "pid": os.getpid(),
+            "thread": threading.get_ident(),
+            "start_us": (self.wall - recorder.origin_ns) / 1e3,
+            "wall_ms": (wall - self.wall) / 1e6,
+            "cpu_ms": (cpu - self.cpu) / 1e6,
+            "rows": self.rows,
+            "rows_per_s": self.rows / ((wall - self.wall) / 1e9) if self.rows and wall > self.wall else None,
+            "peak_rss_mb": rss,
+            "peak_rss_growth_mb": rss - self.rss if rss is not None else None,
+            "allocated_blocks": blocks - self.blocks,
+        }
+        if recorder.trace_allocations:
+            peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+            record["traced_peak_mb"] = peak / 1e6
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        recorder.records.append(record)
+        return False
+
+
+class StageRecorder:
+    """
+    Collects one record per finished stage. Nested stages are kept as separate
+    records (with depth / parent), so a parent's times include its children.
+
+    allocated_blocks is the net change of live interpreter blocks over the stage;
+    trace_allocations=True also records the traced (Python + NumPy) memory peak.
+    profile_stage names a stage to profile with `profiler` every time it runs.
+    """
+
+    def __init__(self, trace_allocations=False, profile_stage=None, profiler="cprofile",
+                 sampling_interval=0.001, origin_ns=None):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.trace_allocations = trace_allocations
+        self.profile_stage = profile_stage
+        self.profiler = profiler
+        self.records = []
+        # perf_counter is system-wide monotonic, so workers given the parent's origin line up
+        self.origin_ns = time.perf_counter_ns() if origin_ns is None else origin_ns
+        self.created = datetime.now().isoformat()
+        self._local = threading.local()
+        self._profiling = False
+        self._cprofile = cProfile.Profile() if profiler == "cprofile" else None
+        self._sampler = _SamplingProfiler(sampling_interval) if profiler == "sampling" else None
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _start_profiler(self):
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        else:
+            self._sampler.start(threading.get_ident())
+
+    def _stop_profiler(self):
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        else:
+            self._sampler.stop()
+
+    def summary(self):
+        """Per-stage totals, in order of first completion"""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["name"], {"calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "rows": 0,
+                                                       "allocated_blocks": 0, "peak_rss_mb": None})
+            total["calls"] += 1
+            total["wall_ms"] += record["wall_ms"]
+            total["cpu_ms"] += record["cpu_ms"]
+            total["rows"] += record["rows"] or 0
+            total["allocated_blocks"] += record["allocated_blocks"]
+            if record["peak_rss_mb"] is not None:
+                total["peak_rss_mb"] = max(total["peak_rss_mb"] or 0.0, record["peak_rss_mb"])
+            if "traced_peak_mb" in record:
+                total["traced_peak_mb"] = max(total.get("traced_peak_mb", 0.0), record["traced_peak_mb"])
+            if record["pid"] != os.getpid():
+                total.setdefault("worker_pids", set()).add(record["pid"])
+        for total in totals.values():
+            total["rows_per_s"] = total["rows"] / (total["wall_ms"] / 1e3) if total["rows"] and total["wall_ms"] else None
+            total["worker_processes"] = len(total.pop("worker_pids", ()))
+        return totals
+
+    def write_json(self, path):
+        document = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "created": self.created,
+            "pid": os.getpid(),
+            "argv": sys.argv,
+            "summary": self.summary(),
+            "stages": self.records
+        }
+        with open(path, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    def write_chrome_trace(self, path):
+        """Complete ("X") events, loadable in chrome://tracing and Perfetto"""
+        events = []
+        for record in self.records:
+            args = {key: value for key, value in record.items()
+                    if key not in ("name", "depth", "parent", "pid", "thread", "start_us", "wall_ms")
+                    and value is not None}
+            events.append({"name": record["name"], "cat": "stage", "ph": "X", "ts": record["start_us"],
+                           "dur": record["wall_ms"] * 1e3, "pid": record["pid"], "tid": record["thread"],
+                           "args": args})
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def write_profile(self, path):
+        """cProfile stats (.prof, for pstats / snakeviz) or folded stacks, by profiler"""
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(path)
+        else:
+            self._sampler.write(path)
+
+    def top_functions(self, limit=10):
+        """Top cumulative-time lines of the cProfile capture, as text"""
+        if self._cprofile is None:
+            return "\n".join(f"{count:6d}  {stack.rsplit(';', 1)[-1]}"
+                             for stack, count in self._sampler.stacks.most_common(limit))
+        stream = io.StringIO()
+        pstats.Stats(self._cprofile, stream=stream).sort_stats("cumulative").print_stats(limit)
+        return stream.getvalue()
+
+
+def enable(**options):
+    """Install a StageRecorder for this process; returns it"""
+    global _recorder
+    _recorder = StageRecorder(**options)
+    return _recorder
+
+
+def disable():
+    """Remove the active recorder (stage() becomes a no-op again); returns it"""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    return recorder
+
+
+# ---------------------------------------------------------------------------
+# Process pools
+# ---------------------------------------------------------------------------
+
+def worker_context():
+    """Recorder settings to hand to pool tasks; None while instrumentation is off"""
+    if _recorder is None:
+        return None
+    return {"trace_allocations": _recorder.trace_allocations, "origin_ns": _recorder.origin_ns}
+
+
+def call_recorded(context, function, *args):
+    """
+    Pool-task wrapper: run function(*args) with a recorder for `context` installed
+    in this worker; returns (result, stage records). Profiling stays in the parent.
+    """
+    global _recorder
+    if context is None:
+        return function(*args), []
+    previous = _recorder
+    started_tracing = context["trace_allocations"] and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    recorder = _recorder = StageRecorder(**context)
+    try:
+        result = function(*args)
+    finally:
+        _recorder = previous
+        if started_tracing:
+            tracemalloc.stop()
+    return result, recorder.records
+
+
+def add_records(records):
+    """Merge stage records returned by call_recorded() into the active recorder"""
+    if _recorder is not None:
+        _recorder.records.extend(records)
+
+
+# ---------------------------------------------------------------------------
+# CLI integration
+# ---------------------------------------------------------------------------
+
+def add_arguments(parser):
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--instrument", default=None, metavar="PREFIX",
+                       help="record pipeline stages to PREFIX.json and PREFIX.trace.json (Chrome trace)")
+    group.add_argument("--trace-allocations", action="store_true",
+                       help="also record traced memory peaks per stage (slower)")
+    group.add_argument("--profile-stage", default=None, help="profile every run of this stage")
+    group.add_argument("--profiler", choices=PROFILERS, default="cprofile")
+
+
+def enable_from_args(args):
+    """Start recording when --instrument or --profile-stage was given"""
+    if not (args.instrument or args.profile_stage):
+        return None
+    if args.trace_allocations:
+        tracemalloc.start()
+    return enable(trace_allocations=args.trace_allocations, profile_stage=args.profile_stage,
+                  profiler=args.profiler)
+
+
+def finish_from_args(args):
+    """Stop recording, write the requested outputs and print a stage table"""
+    recorder = disable()
+    if recorder is None:
+        return None
+    if args.trace_allocations:
+        tracemalloc.stop()
+    prefix = args.instrument or "stage_profile"
+    os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+
+    print(f"\n⏱️ Pipeline stages:")
+    summary = recorder.summary()
+    for name, total in summary.items():
+        throughput = f", {total['rows_per_s']:,.0f} rows/s" if total["rows_per_s"] else ""
+        rss = f", peak RSS {total['peak_rss_mb']:.0f} MB" if total["peak_rss_mb"] is not None else ""
+        workers = f", in {total['worker_processes']} worker(s)" if total["worker_processes"] else ""
+        print(f"   {name:<24} x{total['calls']:<4} wall {total['wall_ms']:9.1f} ms, "
+              f"CPU {total['cpu_ms']:9.1f} ms{throughput}{rss}{workers}")
+    if any(total["worker_processes"] for total in summary.values()):
+        print("   ℹ️  Worker stages: times are summed over workers, peak RSS is per process")
+
+    if args.instrument:
+        recorder.write_json(f"{prefix}.json")
+        recorder.write_chrome_trace(f"{prefix}.trace.json")
+        print(f"   📁 {prefix}.json, {prefix}.trace.json")
+    if args.profile_stage:
+        path = f"{prefix}.{args.profile_stage}." + ("prof" if args.profiler == "cprofile" else "folded")
+        recorder.write_profile(path)
+        print(f"   🔬 {args.profiler} profile of '{args.profile_stage}': {path}")
+        print(recorder.top_functions())
+    return recorder
+
+
+def main():
+    """Measure the cost of a disabled and an enabled stage() call"""
+    parser = argparse.ArgumentParser(description="Pipeline stage instrumentation overhead")
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print("⏱️ Pipeline Stage Instrumentation")
+    print("=" * 50)
+
+    def loop(calls):
+        start = time.perf_counter()
+        for _ in range(calls):
+            with stage("noop"):
+                pass
+        return (time.perf_counter() - start) / calls * 1e9
+
+    disabled_ns = loop(args.calls)
+    enable()
+    enabled_ns = loop(args.calls // 10)
+    disable()
+    print(f"✅ stage() disabled: {disabled_ns:.0f} ns per stage, enabled: {enabled_ns:.0f} ns per stage")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Incremental Load-Velocity Profiles
+Per-athlete, per-exercise regression sufficient statistics with O(1) updates and 1RM queries
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from real_data_collection_protocol import EXERCISES, VELOCITY_LOAD_EQUATIONS
+
+# Population minimum velocity threshold: velocity at 100% 1RM of the generator's equations
+POPULATION_MVT = {exercise: intercept - slope * 100
+                  for exercise, (intercept, slope) in VELOCITY_LOAD_EQUATIONS.items()}
+
+# Sufficient-statistic columns for the regression velocity = intercept + slope * load_kg
+_N, _SUM_X, _SUM_Y, _SUM_XX, _SUM_XY, _SUM_YY = range(6)
+_N_STATS = 6
+
+
+class LoadVelocityProfiles:
+    """
+    Running least-squares load-velocity lines indexed by (participant_id, exercise).
+    State is six float64 sums plus an optional recorded 1RM per profile, stored in
+    contiguous arrays; a dict maps each key to its row.
+    """
+
+    def __init__(self, capacity=1024):
+        self.index = {}
+        self.keys = []
+        self._stats = np.zeros((capacity, _N_STATS))
+        self._recorded_1rm = np.full(capacity, np.nan)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, participant_id, exercise, create=False):
+        key = (participant_id, exercise)
+        row = self.index.get(key)
+        if row is None:
+            if not create:
+                raise KeyError(f"No profile for {participant_id} / {exercise}")
+            row = len(self.keys)
+            if row == len(self._stats):
+                self._stats = np.concatenate([self._stats, np.zeros_like(self._stats)])
+                self._recorded_1rm = np.concatenate([self._recorded_1rm, np.full(row, np.nan)])
+            self.index[key] = row
+            self.keys.append(key)
+        return row
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def update(self, participant_id, exercise, load_kg, velocity):
+        """Add one rep in O(1)"""
+        # Resolve the row first: creating it may grow (and rebind) the arrays
+        row = self._row(participant_id, exercise, create=True)
+        self._stats[row] += (1.0, load_kg, velocity, load_kg * load_kg, load_kg * velocity, velocity * velocity)
+
+    def update_many(self, participant_ids, exercises, loads_kg, velocities):
+        """Add a batch of reps; sums are accumulated per profile with bincount"""
+        keys = pd.MultiIndex.from_arrays([np.asarray(participant_ids).astype(str),
+                                          np.asarray(exercises).astype(str)])
+        codes, unique_keys = pd.factorize(keys)
+        rows = np.array([self._row(pid, exercise, create=True) for pid, exercise in unique_keys])
+
+        x = np.asarray(loads_kg, dtype=np.float64)
+        y = np.asarray(velocities, dtype=np.float64)
+        n_keys = len(unique_keys)
+        sums = np.column_stack([
+            np.bincount(codes, minlength=n_keys).astype(np.float64),
+            np.bincount(codes, x, n_keys),
+            np.bincount(codes, y, n_keys),
+            np.bincount(codes, x * x, n_keys),
+            np.bincount(codes, x * y, n_keys),
+            np.bincount(codes, y * y, n_keys),
+        ])
+        self._stats[rows] += sums
+
+    def set_recorded_1rm(self, participant_id, exercise, one_rm_kg):
+        row = self._row(participant_id, exercise, create=True)
+        self._recorded_1rm[row] = one_rm_kg
+
+    @classmethod
+    def from_measurements(cls, measurements_df, participants_df=None):
+        """Bulk initialization from the measurements table (and recorded 1RMs, if given)"""
+        profiles = cls(capacity=max(1024, len(measurements_df) // 10))
+        profiles.update_many(measurements_df["participant_id"], measurements_df["exercise"],
+                             measurements_df["load_kg"], measurements_df["mean_concentric_velocity"])
+        if participants_df is not None:
+            for exercise in EXERCISES:
+                for participant_id, one_rm in zip(participants_df["participant_id"].astype(str),
+                                                  participants_df[f"{exercise}_1rm"]):
+                    if (participant_id, exercise) in profiles.index:
+                        profiles.set_recorded_1rm(participant_id, exercise, one_rm)
+        return profiles
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _line(self, participant_id, exercise):
+        """(intercept, slope, n) of the least-squares line; NaN when under-determined"""
+        n, sum_x, sum_y, sum_xx, sum_xy, _ = self._stats[self._row(participant_id, exercise)].tolist()
+        denominator = n * sum_xx - sum_x * sum_x
+        if n < 2 or denominator <= 1e-12 * n * sum_xx:
+            return math.nan, math.nan, n
+        slope = (n * sum_xy - sum_x * sum_y) / denominator
+        return (sum_y - slope * sum_x) / n, slope, n
+
+    def profile(self, participant_id, exercise):
+        """Fitted line with r² and standard error of the estimate"""
+        n, sum_x, sum_y, sum_xx, sum_xy, sum_yy = self._stats[self._row(participant_id, exercise)].tolist()
+        intercept, slope, _ = self._line(participant_id, exercise)
+        ss_total = sum_yy - sum_y * sum_y / n if n else math.nan
+        ss_residual = max(0.0, sum_yy - intercept * sum_y - slope * sum_xy)
+        return {
+            "participant_id": participant_id,
+            "exercise": exercise,
+            "n": int(n),
+            "intercept": intercept,
+            "slope": slope,
+            "r2": 1 - ss_residual / ss_total if ss_total > 0 else math.nan,
+            "see": math.sqrt(ss_residual / (n - 2)) if n > 2 else math.nan,
+            "estimated_1rm": self.estimated_1rm(participant_id, exercise),
+            "mvt": self.minimum_velocity_threshold(participant_id, exercise)
+        }
+
+    def velocity_at_load(self, participant_id, exercise, load_kg):
+        intercept, slope, _ = self._line(participant_id, exercise)
+        return intercept + slope * load_kg
+
+    def load_at_velocity(self, participant_id, exercise, velocity):
+        intercept, slope, _ = self._line(participant_id, exercise)
+        return (velocity - intercept) / slope if slope < 0 else math.nan
+
+    def minimum_velocity_threshold(self, participant_id, exercise):
+        """
+        Velocity at the athlete's recorded 1RM when one is known,
+        otherwise the population threshold for the exercise
+        """
+        recorded = float(self._recorded_1rm[self._row(participant_id, exercise)])
+        if not math.isnan(recorded):
+            velocity = self.velocity_at_load(participant_id, exercise, recorded)
+            if not math.isnan(velocity):
+                return velocity
+        return POPULATION_MVT[exercise]
+
+    def estimated_1rm(self, participant_id, exercise, mvt=None):
+        """Load at which the profile reaches the minimum velocity threshold"""
+        if mvt is None:
+            mvt = POPULATION_MVT[exercise]
+        return self.load_at_velocity(participant_id, exercise, mvt)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path):
+        """Compact state (keys, sums, recorded 1RMs) as .npz, replaced atomically"""
+        n = len(self.keys)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path,
+                 participant_id=np.array([key[0] for key in self.keys], dtype=str),
+                 exercise=np.array([key[1] for key in self.keys], dtype=str),
+                 stats=self._stats[:n],
+                 recorded_1rm=self._recorded_1rm[:n])
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            n = len(data["stats"])
+            profiles = cls(capacity=max(1024, n))
+            profiles.keys = list(zip(data["participant_id"].tolist(), data["exercise"].tolist()))
+            profiles.index = {key: row for row, key in enumerate(profiles.keys)}
+            profiles._stats[:n] = data["stats"]
+            profiles._recorded_1rm[:n] = data["recorded_1rm"]
+        return profiles
+
+
+def _microseconds(function, repeat=20000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    """Fit profiles for a dataset, check 1RM estimates and time updates / queries"""
+    parser = argparse.ArgumentParser(description="Incremental load-velocity profiles")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--state", default=None, help="save the profile state here (.npz)")
+    args = parser.parse_args()
+
+    print("📈 Incremental Load-Velocity Profiles")
+    print("=" * 50)
+
+    participants_df = pd.read_csv(os.path.join(args.dataset_dir, "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+
+    start = time.perf_counter()
+    profiles = LoadVelocityProfiles.from_measurements(measurements_df, participants_df)
+    bulk_seconds = time.perf_counter() - start
+    print(f"✅ {len(profiles)} profiles from {len(measurements_df)} reps in {bulk_seconds * 1000:.1f} ms")
+
+    errors = []
+    for exercise in EXERCISES:
+        for participant_id, recorded in zip(participants_df["participant_id"], participants_df[f"{exercise}_1rm"]):
+            errors.append(profiles.estimated_1rm(participant_id, exercise) / recorded - 1)
+    errors = np.abs(errors) * 100
+    print(f"   🎯 1RM estimate vs recorded: median error {np.median(errors):.1f}%, "
+          f"90th percentile {np.percentile(errors, 90):.1f}%")
+
+    participant_id, exercise = profiles.keys[0]
+    scratch = LoadVelocityProfiles()
+    update_us = _microseconds(lambda: scratch.update(participant_id, exercise, 100.0, 0.55))
+    one_rm_us = _microseconds(lambda: profiles.estimated_1rm(participant_id, exercise))
+    velocity_us = _microseconds(lambda: profiles.velocity_at_load(participant_id, exercise, 120.0))
+    mvt_us = _microseconds(lambda: profiles.minimum_velocity_threshold(participant_id, exercise))
+
+    subset = measurements_df[["participant_id", "exercise", "load_kg", "mean_concentric_velocity"]]
+    start = time.perf_counter()
+    subset.groupby(["participant_id", "exercise"]).apply(
+        lambda group: np.polyfit(group["load_kg"], group["mean_concentric_velocity"], 1))
+    regroup_ms = (time.perf_counter() - start) * 1000
+
+    print(f"   ⚡ update {update_us:.2f} µs, 1RM {one_rm_us:.2f} µs, velocity-at-load {velocity_us:.2f} µs, "
+          f"MVT {mvt_us:.2f} µs")
+    print(f"   🐌 Regrouping the table and refitting: {regroup_ms:.1f} ms")
+
+    if args.state:
+        profiles.save(args.state)
+        restored = LoadVelocityProfiles.load(args.state)
+        assert restored.keys == profiles.keys
+        assert np.array_equal(restored._stats[:len(restored)], profiles._stats[:len(profiles)])
+        print(f"   💾 State saved to {args.state} ({os.path.getsize(args.state) / 1024:.1f} KB)")
+
+
+if __name__ == "__main__":
+    main()
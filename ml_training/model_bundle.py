@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Quantized On-Device Model Bundle
+Packs the performance / technique / fatigue heads into one int8 or float16 file
+with a fixed binary layout, converts prediction JSON to prediction bundles, and
+checks the accuracy lost to quantization against the float64 models
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_prediction_pipeline import (
+    HEAD_FILES,
+    PERFORMANCE_OUTPUTS,
+    PredictionBundleWriter,
+    read_prediction_bundle,
+)
+from feature_engineering import build_input_features
+from numpy_inference import FATIGUE_OUTPUTS, NumpyMLPPredictor, _load_pickle
+
+DEFAULT_BUNDLE = "sklearn_models/model_bundle.vbtm"
+DEFAULT_PREDICTION_BUNDLE = "flutter_predictions/sample_predictions.vbtp"
+
+# Layout (little-endian, every section starts on a 16-byte boundary):
+#   BUNDLE_HEADER | metadata JSON (names, classes, sources) | HEAD_ENTRY x n_heads |
+#   per head, at its offset: LAYER_ENTRY x n_layers, input_mean f32[n_features],
+#   input_scale f32[n_features], then per layer [int8: scale f32[fan_out]],
+#   weights (fan_in x fan_out, row-major) in the weight dtype, biases f32[fan_out]
+BUNDLE_MAGIC = b"VBTMODL1"
+BUNDLE_VERSION = 1
+BUNDLE_ALIGNMENT = 16
+BUNDLE_HEADER = struct.Struct('<8sHHI')              # magic, version, n_heads, metadata bytes
+HEAD_ENTRY = struct.Struct('<16sBBBBHHII')           # name, weight dtype, activation, out activation,
+                                                     # n_layers, n_features, n_outputs, offset, bytes
+LAYER_ENTRY = struct.Struct('<HH')                   # fan_in, fan_out
+
+WEIGHT_DTYPES = ("float32", "float16", "int8")
+ACTIVATION_CODES = ("identity", "relu", "tanh", "logistic", "softmax")
+
+# float64 reference models for the parity check, where the original pickle ships
+REFERENCE_PICKLES = {"fatigue": "fatigue_model.pkl"}
+# Largest acceptable relative error of a bundled head against its reference
+PARITY_TOLERANCE = 0.01
+
+
+def _pad(size):
+    return -size % BUNDLE_ALIGNMENT
+
+
+def quantize_weights(weights, weight_dtype):
+    """(stored array, per-output-column scales or None); int8 is symmetric per output column"""
+    if weight_dtype == "int8":
+        scale = np.abs(weights).max(axis=0) / 127
+        scale[scale == 0] = 1.0
+        return np.clip(np.rint(weights / scale), -127, 127).astype(np.int8), scale.astype('<f4')
+    return weights.astype(np.dtype(weight_dtype).newbyteorder("<")), None
+
+
+def _head_block(predictor, weight_dtype):
+    parts = [LAYER_ENTRY.pack(*weights.shape) for weights in predictor.weights]
+    parts.append(b"\0" * _pad(sum(len(part) for part in parts)))
+    scaling = np.concatenate([predictor.input_mean, predictor.input_scale]).astype('<f4').tobytes()
+    parts.append(scaling + b"\0" * _pad(len(scaling)))
+    for weights, biases in zip(predictor.weights, predictor.biases):
+        stored, scale = quantize_weights(np.asarray(weights, dtype=np.float64), weight_dtype)
+        for array in ([scale] if scale is not None else []) + [stored, np.asarray(biases, dtype='<f4')]:
+            data = np.ascontiguousarray(array).tobytes()
+            parts.append(data + b"\0" * _pad(len(data)))
+    return b"".join(parts)
+
+
+def export_bundle(model_dir, output_path, weight_dtype="float16", head_files=HEAD_FILES):
+    """Write every exported head in `model_dir` into one bundle; returns the metadata"""
+    if weight_dtype not in WEIGHT_DTYPES:
+        raise ValueError(f"Unknown weight dtype: {weight_dtype}")
+    for name in head_files:
+        if len(name.encode("utf-8")) > 16:
+            raise ValueError(f"Head name too long for the bundle index (16 bytes max): {name}")
+    predictors = {name: NumpyMLPPredictor(os.path.join(model_dir, filename))
+                  for name, filename in head_files.items()}
+    metadata = json.dumps({
+        "weight_dtype": weight_dtype,
+        "heads": {name: {key: predictor.header[key] for key in ("source", "output_names", "classes")
+                         if key in predictor.header}
+                  for name, predictor in predictors.items()}
+    }, separators=(",", ":")).encode("utf-8")
+
+    offset = BUNDLE_HEADER.size + len(metadata)
+    offset += _pad(offset) + len(predictors) * HEAD_ENTRY.size
+    offset += _pad(offset)
+    entries, blocks = [], []
+    for name, predictor in predictors.items():
+        block = _head_block(predictor, weight_dtype)
+        header = predictor.header
+        entries.append(HEAD_ENTRY.pack(name.encode("utf-8"), WEIGHT_DTYPES.index(weight_dtype),
+                                       ACTIVATION_CODES.index(header["activation"]),
+                                       ACTIVATION_CODES.index(header["out_activation"]),
+                                       header["n_layers"], header["n_features"], header["n_outputs"],
+                                       offset, len(block)))
+        blocks.append(block)
+        offset += len(block)
+
+    head_table = b"".join(entries)
+    prefix = BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(predictors), len(metadata)) + metadata
+    prefix += b"\0" * _pad(len(prefix))
+    prefix += head_table + b"\0" * _pad(len(head_table))
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(prefix + b"".join(blocks))
+    os.replace(tmp_path, output_path)
+    return json.loads(metadata)
+
+
+class ModelBundle:
+    """
+    Reader: parses the bundle in one pass and dequantizes every head to float32,
+    exposing each as a NumpyMLPPredictor in `heads`
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            buffer = f.read()
+        magic, version, n_heads, metadata_bytes = BUNDLE_HEADER.unpack_from(buffer)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if version != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported model bundle version {version}")
+        position = BUNDLE_HEADER.size
+        self.metadata = json.loads(buffer[position:position + metadata_bytes])
+        position += metadata_bytes
+        position += _pad(position)
+
+        self.heads = {}
+        for i in range(n_heads):
+            (name, dtype_code, activation, out_activation, n_layers, n_features, n_outputs,
+             offset, _) = HEAD_ENTRY.unpack_from(buffer, position + i * HEAD_ENTRY.size)
+            name = name.rstrip(b"\0").decode("utf-8")
+            header = dict(self.metadata["heads"][name], activation=ACTIVATION_CODES[activation],
+                          out_activation=ACTIVATION_CODES[out_activation], n_layers=n_layers,
+                          n_features=n_features, n_outputs=n_outputs)
+            self.heads[name] = self._read_head(buffer, offset, header, WEIGHT_DTYPES[dtype_code])
+
+    @staticmethod
+    def _read_head(buffer, offset, header, weight_dtype):
+        shapes = [LAYER_ENTRY.unpack_from(buffer, offset + i * LAYER_ENTRY.size)
+                  for i in range(header["n_layers"])]
+        position = offset + len(shapes) * LAYER_ENTRY.size
+        position += _pad(position)
+
+        def take(dtype, count):
+            nonlocal position
+            array = np.frombuffer(buffer, dtype=dtype, count=count, offset=position)
+            position += array.nbytes + _pad(array.nbytes)
+            return array
+
+        n_features = header["n_features"]
+        input_mean = np.frombuffer(buffer, '<f4', n_features, position)
+        input_scale = np.frombuffer(buffer, '<f4', n_features, position + 4 * n_features)
+        position += 8 * n_features + _pad(8 * n_features)
+        weights, biases = [], []
+        for fan_in, fan_out in shapes:
+            if weight_dtype == "int8":
+                scale = take('<f4', fan_out)
+                weights.append(take(np.int8, fan_in * fan_out).reshape(fan_in, fan_out) * scale)
+            else:
+                stored = take(np.dtype(weight_dtype).newbyteorder("<"), fan_in * fan_out)
+                weights.append(stored.reshape(fan_in, fan_out).astype(np.float32))
+            biases.append(take('<f4', fan_out))
+        return NumpyMLPPredictor.from_arrays(header, weights, biases, input_mean, input_scale)
+
+
+def check_bundle_parity(bundle_path, model_dir, X, head_files=HEAD_FILES, tolerance=PARITY_TOLERANCE):
+    """
+    Accuracy lost per head: the bundle against the float64 original (the sklearn
+    pickle where one ships, else the exported float32 weights evaluated in float64).
+    A head passes when its max relative error is within `tolerance`.
+    """
+    bundle = ModelBundle(bundle_path)
+    results = {}
+    for name, filename in head_files.items():
+        pickle_path = os.path.join(model_dir, REFERENCE_PICKLES.get(name, ""))
+        if name in REFERENCE_PICKLES and os.path.exists(pickle_path):
+            reference, reference_name = _load_pickle(pickle_path).predict(X), REFERENCE_PICKLES[name]
+        else:
+            reference = NumpyMLPPredictor(os.path.join(model_dir, filename)).predict(X, dtype=np.float64)
+            reference_name = f"{filename} (float64)"
+        head = bundle.heads[name]
+        prediction = head.predict(X)
+        reference = np.asarray(reference, dtype=np.float64).reshape(prediction.shape)
+        abs_error = np.abs(prediction - reference)
+        result = {
+            "reference": reference_name,
+            "max_abs_error": float(abs_error.max()),
+            "mean_abs_error": float(abs_error.mean()),
+            # Relative to each output's largest magnitude, as in numpy_inference.check_parity
+            "max_rel_error": float((abs_error / np.abs(reference).max(axis=0)).max())
+        }
+        result["passed"] = result["max_rel_error"] <= tolerance
+        if head.classes is not None:
+            result["class_agreement"] = float(np.mean(prediction.argmax(axis=1) == reference.argmax(axis=1)))
+        results[name] = result
+    return results
+
+
+def convert_prediction_json(json_path, bundle_path, precision="float16"):
+    """Rewrite a sample_predictions.json style list as a prediction bundle; returns the row count"""
+    with open(json_path) as f:
+        records = json.load(f)
+    X = np.array([record["input_features"] for record in records], dtype=np.float32)
+    technique = [record["technique_prediction"] for record in records]
+    predictions = {
+        "performance": np.array([[record["performance_prediction"][name] for name in PERFORMANCE_OUTPUTS]
+                                 for record in records]),
+        "technique_class_index": np.array([t["class_index"] for t in technique], dtype=np.uint8),
+        "technique_probabilities": np.array([t["probabilities"] for t in technique]),
+        "fatigue": np.array([[record["fatigue_prediction"][name] for name in FATIGUE_OUTPUTS]
+                             for record in records]),
+    }
+    writer = PredictionBundleWriter(bundle_path, precision)
+    try:
+        writer.write(X, predictions)
+    finally:
+        writer.close()
+    return len(records)
+
+
+def _median_ms(function, repeats=50):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def main():
+    """Export the quantized bundle, convert the sample predictions and report size / parse time / parity"""
+    parser = argparse.ArgumentParser(description="Quantized on-device model and prediction bundles")
+    parser.add_argument("--model-dir", default="sklearn_models")
+    parser.add_argument("--dtype", choices=WEIGHT_DTYPES, default="float16",
+                        help="weight storage type (int8 is smallest but can exceed the parity tolerance, "
+                             "float16 keeps errors below 0.1%%)")
+    parser.add_argument("--tolerance", type=float, default=PARITY_TOLERANCE,
+                        help="max relative error per head before the parity check fails")
+    parser.add_argument("--output", default=DEFAULT_BUNDLE)
+    parser.add_argument("--predictions", default="flutter_predictions/sample_predictions.json")
+    parser.add_argument("--predictions-output", default=DEFAULT_PREDICTION_BUNDLE)
+    parser.add_argument("--precision", choices=["float16", "float32"], default="float16",
+                        help="prediction bundle float precision")
+    parser.add_argument("--dataset-dir", default="./academic_dataset", help="inputs for the parity check")
+    args = parser.parse_args()
+
+    print("📦 Quantized On-Device Bundles")
+    print("=" * 50)
+
+    export_bundle(args.model_dir, args.output, args.dtype)
+    bundle_bytes = os.path.getsize(args.output)
+    sources = [os.path.join(args.model_dir, filename) for filename in HEAD_FILES.values()]
+    pickles = [os.path.join(args.model_dir, filename) for filename in REFERENCE_PICKLES.values()]
+    print(f"✅ Model bundle: {args.output} ({bundle_bytes / 1024:.1f} KB, {args.dtype} weights)")
+    print(f"   📉 Size: .npz heads {sum(map(os.path.getsize, sources)) / 1024:.1f} KB, "
+          f"pickled float64 MLP {sum(map(os.path.getsize, pickles)) / 1024:.1f} KB")
+    print(f"   ⚡ Parse: bundle {_median_ms(lambda: ModelBundle(args.output)):.3f} ms, "
+          f".npz heads {_median_ms(lambda: [NumpyMLPPredictor(path) for path in sources]):.3f} ms, "
+          f"pickle {_median_ms(lambda: [_load_pickle(path) for path in pickles], 10):.3f} ms")
+
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+    participants_df = pd.read_csv(os.path.join(args.dataset_dir, "participants.csv"))
+    X = build_input_features(measurements_df, participants_df)
+    parity = check_bundle_parity(args.output, args.model_dir, X, tolerance=args.tolerance)
+    for name, result in parity.items():
+        agreement = f", class agreement {result['class_agreement']:.2%}" if "class_agreement" in result else ""
+        print(f"   {'🎯' if result['passed'] else '❌'} {name:<12} vs {result['reference']}: "
+              f"max rel error {result['max_rel_error']:.2e}, mean abs error {result['mean_abs_error']:.2e}{agreement}")
+
+    rows = convert_prediction_json(args.predictions, args.predictions_output, args.precision)
+
+    def parse_json():
+        with open(args.predictions) as f:
+            return json.load(f)
+
+    def parse_bundle():
+        records, _ = read_prediction_bundle(args.predictions_output)
+        return np.array(records)
+
+    print(f"✅ Prediction bundle: {args.predictions_output} ({rows} rows, {args.precision})")
+    print(f"   📉 Size: {os.path.getsize(args.predictions) / 1024:.1f} KB JSON -> "
+          f"{os.path.getsize(args.predictions_output) / 1024:.1f} KB")
+    print(f"   ⚡ Parse: JSON {_median_ms(parse_json):.3f} ms -> bundle {_median_ms(parse_bundle):.3f} ms")
+
+    failed = [name for name, result in parity.items() if not result["passed"]]
+    if failed:
+        print(f"❌ {', '.join(failed)} outside the {args.tolerance:.1%} parity tolerance with {args.dtype} weights; "
+              f"use a wider --dtype")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
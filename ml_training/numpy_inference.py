@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Dependency-free NumPy Inference Runtime
+Exports sklearn MLP / linear models to .npz and runs batched float32 forward passes
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+FORMAT_NAME = "vbt-mlp"
+FORMAT_VERSION = 1
+
+# Output order of fatigue_model.pkl (matches fatigue_prediction in sample_predictions.json)
+FATIGUE_OUTPUTS = ["fatigue_level", "velocity_loss", "remaining_reps"]
+
+ACTIVATIONS = {
+    "identity": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "tanh": lambda x: np.tanh(x, out=x),
+    "logistic": lambda x: np.reciprocal(1 + np.exp(-x, out=x), out=x),
+}
+
+
+def _stage(name):
+    # Pipeline instrumentation when this runtime runs inside ml_training; imported
+    # lazily so the module stays standalone (and import-light) on its own
+    try:
+        from instrumentation import stage
+    except ImportError:
+        return contextlib.nullcontext()
+    return stage(name)
+
+
+def _load_pickle(path):
+    with _stage("model_load"):
+        try:
+            import joblib
+            return joblib.load(path)
+        except ImportError:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+
+def _split_pipeline(model):
+    """Return (input scaler or None, MLP) for a bare MLP or a scaler -> MLP Pipeline"""
+    if hasattr(model, "steps"):
+        *preprocessing, (_, estimator) = model.steps
+        if len(preprocessing) > 1:
+            raise ValueError("Only a single scaler step before the MLP is supported")
+        scaler = preprocessing[0][1] if preprocessing else None
+        return scaler, estimator
+    return None, model
+
+
+def _scaler_arrays(scaler, n_features):
+    """Express StandardScaler / MinMaxScaler as x' = (x - mean) / scale"""
+    if scaler is None:
+        return np.zeros(n_features), np.ones(n_features)
+    if hasattr(scaler, "mean_"):
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        return mean, scale
+    if hasattr(scaler, "data_min_"):
+        # MinMaxScaler: x' = x * scale_ + min_  ->  (x + min_/scale_) / (1/scale_)
+        return -scaler.min_ / scaler.scale_, 1.0 / scaler.scale_
+    raise ValueError(f"Unsupported scaler: {type(scaler).__name__}")
+
+
+def _softmax(x):
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+ACTIVATIONS["softmax"] = _softmax
+
+
+def _estimator_layers(estimator):
+    """Dense layers of an MLP or linear estimator as (weights, biases, activation, out_activation, extra header)"""
+    if hasattr(estimator, "coefs_"):
+        if estimator.activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation: {estimator.activation}")
+        out_activation = estimator.out_activation_
+        if out_activation == "softmax" or (out_activation == "logistic" and hasattr(estimator, "classes_")):
+            raise ValueError("Export MLP classifiers through a linear softmax head instead")
+        return (list(estimator.coefs_), list(estimator.intercepts_), estimator.activation,
+                out_activation, {})
+
+    if hasattr(estimator, "coef_"):
+        weights = np.atleast_2d(estimator.coef_).T
+        biases = np.atleast_1d(np.asarray(estimator.intercept_, dtype=np.float64))
+        if hasattr(estimator, "predict_proba"):
+            if weights.shape[1] == 1:  # Binary logistic regression -> two-logit softmax
+                weights = np.hstack([np.zeros_like(weights), weights])
+                biases = np.concatenate([[0.0], biases])
+            classes = [c.item() if hasattr(c, "item") else c for c in estimator.classes_]
+            return [weights], [biases], "identity", "softmax", {"classes": classes}
+        return [weights], [np.broadcast_to(biases, weights.shape[1])], "identity", "identity", {}
+
+    raise ValueError(f"Unsupported estimator: {type(estimator).__name__}")
+
+
+def export_model(model, output_path, output_names=None, source=None):
+    """
+    Write weights, biases and input scaling of a fitted MLPRegressor or
+    linear model (optionally behind a scaler in a Pipeline) to an uncompressed .npz
+    """
+    scaler, estimator = _split_pipeline(model)
+    weights, biases, activation, out_activation, extra = _estimator_layers(estimator)
+
+    n_features = weights[0].shape[0]
+    input_mean, input_scale = _scaler_arrays(scaler, n_features)
+    n_outputs = weights[-1].shape[1]
+
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "source": source or type(estimator).__name__,
+        "activation": activation,
+        "out_activation": out_activation,
+        "n_layers": len(weights),
+        "n_features": n_features,
+        "n_outputs": n_outputs,
+        "output_names": output_names or [f"output_{i}" for i in range(n_outputs)]
+    }
+    header.update(extra)
+    arrays = {
+        "header": np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8),
+        "input_mean": input_mean.astype(np.float32),
+        "input_scale": input_scale.astype(np.float32),
+    }
+    for i, (layer_weights, layer_biases) in enumerate(zip(weights, biases)):
+        arrays[f"W{i}"] = np.ascontiguousarray(layer_weights, dtype=np.float32)
+        arrays[f"b{i}"] = np.ascontiguousarray(layer_biases, dtype=np.float32)
+
+    np.savez(output_path, **arrays)
+    return header
+
+
+def export_mlp(model_path, output_path, output_names=None):
+    """
+    Export a pickled model (see export_model) from disk
+    """
+    return export_model(_load_pickle(model_path), output_path, output_names,
+                        source=os.path.basename(model_path))
+
+
+class NumpyMLPPredictor:
+    """
+    Forward pass of an exported MLP / linear head using only NumPy (no scikit-learn import)
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            if header.get("format") != FORMAT_NAME:
+                raise ValueError(f"{path} is not a {FORMAT_NAME} export")
+            n_layers = header["n_layers"]
+            self._init_arrays(header, [data[f"W{i}"] for i in range(n_layers)],
+                              [data[f"b{i}"] for i in range(n_layers)], data["input_mean"], data["input_scale"])
+
+    @classmethod
+    def from_arrays(cls, header, weights, biases, input_mean, input_scale):
+        """Predictor over in-memory float32 arrays (e.g. dequantized from a model bundle)"""
+        predictor = cls.__new__(cls)
+        predictor._init_arrays(header, weights, biases, input_mean, input_scale)
+        return predictor
+
+    def _init_arrays(self, header, weights, biases, input_mean, input_scale):
+        self.header = header
+        self.weights = weights
+        self.biases = biases
+        self.input_mean = input_mean
+        self.input_scale = input_scale
+        self.output_names = header["output_names"]
+        self.classes = header.get("classes")
+        self._hidden_activation = ACTIVATIONS[header["activation"]]
+        self._output_activation = ACTIVATIONS[header["out_activation"]]
+
+    def predict(self, X, batch_size=65536, dtype=np.float32):
+        """
+        Batched forward pass; returns (n_samples, n_outputs) like MLPRegressor.predict.
+        dtype=np.float64 evaluates the float32 weights in double precision (a reference).
+        """
+        X = np.asarray(X, dtype=dtype)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        output = np.empty((len(X), self.header["n_outputs"]), dtype=dtype)
+        for start in range(0, len(X), batch_size):
+            h = (X[start:start + batch_size] - self.input_mean) / self.input_scale
+            last = len(self.weights) - 1
+            for i, (weights, biases) in enumerate(zip(self.weights, self.biases)):
+                h = h @ weights
+                h += biases
+                h = self._output_activation(h) if i == last else self._hidden_activation(h)
+            output[start:start + batch_size] = h
+
+        return output
+
+
+def check_parity(model_path, export_path, X):
+    """Max absolute / relative difference between sklearn predict and the NumPy runtime"""
+    reference = _load_pickle(model_path).predict(X)
+    prediction = NumpyMLPPredictor(export_path).predict(X)
+    reference = reference.reshape(prediction.shape)
+    abs_error = np.abs(prediction - reference)
+    return {
+        "max_abs_error": float(abs_error.max()),
+        # Relative to each output's largest magnitude, so near-zero targets don't dominate
+        "max_rel_error": float((abs_error / np.abs(reference).max(axis=0)).max())
+    }
+
+
+def _startup_seconds(code):
+    """Wall time of `code` in a fresh interpreter (includes imports and model load)"""
+    script = f"import time\nstart = time.perf_counter()\n{code}\nprint(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def benchmark(model_path, export_path, batch_sizes=(1, 64, 4096, 65536), repeats=20):
+    """Cold-start and per-batch latency: pickle + sklearn vs exported NumPy runtime"""
+    model_path = os.path.abspath(model_path)
+    export_path = os.path.abspath(export_path)
+    results = {
+        "startup_pickle_s": _startup_seconds(
+            f"import joblib\nmodel = joblib.load({model_path!r})"),
+        "startup_numpy_s": _startup_seconds(
+            f"from numpy_inference import NumpyMLPPredictor\nmodel = NumpyMLPPredictor({export_path!r})"),
+        "batches": []
+    }
+
+    sklearn_model = _load_pickle(model_path)
+    numpy_model = NumpyMLPPredictor(export_path)
+    rng = np.random.default_rng(0)
+    for batch_size in batch_sizes:
+        X = rng.normal(1.0, 0.5, (batch_size, numpy_model.header["n_features"]))
+        timings = {}
+        for name, predict in (("pickle", sklearn_model.predict), ("numpy", numpy_model.predict)):
+            predict(X)  # warm-up
+            start = time.perf_counter()
+            for _ in range(repeats):
+                predict(X)
+            timings[name] = (time.perf_counter() - start) / repeats
+        results["batches"].append({"batch_size": batch_size,
+                                   "pickle_ms": timings["pickle"] * 1000,
+                                   "numpy_ms": timings["numpy"] * 1000})
+    return results
+
+
+def main():
+    """Export fatigue_model.pkl and report parity + latency"""
+    parser = argparse.ArgumentParser(description="Export an sklearn MLP to the NumPy runtime")
+    parser.add_argument("--model", default="sklearn_models/fatigue_model.pkl")
+    parser.add_argument("--output", default="sklearn_models/fatigue_model.npz")
+    parser.add_argument("--benchmark", action="store_true")
+    args = parser.parse_args()
+
+    print("🧠 NumPy Inference Runtime Export")
+    print("=" * 50)
+
+    header = export_mlp(args.model, args.output, output_names=FATIGUE_OUTPUTS)
+    layers = " -> ".join(str(n) for n in [header["n_features"]] +
+                         [w.shape[1] for w in NumpyMLPPredictor(args.output).weights])
+    print(f"✅ Exported: {args.output} ({os.path.getsize(args.output) / 1024:.1f} KB, {layers})")
+
+    X = np.random.default_rng(42).normal(1.0, 0.5, (10000, header["n_features"]))
+    parity = check_parity(args.model, args.output, X)
+    print(f"   🎯 Parity: max abs error {parity['max_abs_error']:.2e}, "
+          f"max rel error {parity['max_rel_error']:.2e}")
+
+    if args.benchmark:
+        results = benchmark(args.model, args.output)
+        print(f"\n⏱️ Startup (fresh process, import + load):")
+        print(f"   🐌 pickle + sklearn: {results['startup_pickle_s'] * 1000:8.1f} ms")
+        print(f"   ⚡ NumPy runtime:    {results['startup_numpy_s'] * 1000:8.1f} ms")
+        print(f"⏱️ Batch latency:")
+        for batch in results["batches"]:
+            print(f"   batch {batch['batch_size']:>6}: pickle {batch['pickle_ms']:8.3f} ms, "
+                  f"numpy {batch['numpy_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Leave-One-Participant-Out Cross-Validation Engine
+Executes AcademicVBTDataCollector.create_ml_training_protocol() across a process pool
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering import build_feature_matrix, protocol_feature_config
+from real_data_collection_protocol import AcademicVBTDataCollector
+from reliability_statistics import bland_altman_agreement, icc_agreement
+
+DEFAULT_TARGET = "mean_concentric_velocity"
+# Protocol feature-stage columns that do not leak the velocity target
+DEFAULT_FEATURES = ["load_percent_1rm", "load_kg", "rep_number", "body_mass", "height",
+                    "training_experience", "age", "exercise_squat", "exercise_bench", "exercise_deadlift",
+                    "relative_load", "load_x_experience",
+                    "body_mass_x_squat", "body_mass_x_bench", "body_mass_x_deadlift"]
+
+# Candidate model families named as in create_ml_training_protocol()["model_selection"]
+CANDIDATE_MODELS = {
+    "linear_regression": {},
+    "random_forest": {"n_estimators": 100, "min_samples_leaf": 5},
+    "gradient_boosting": {"n_estimators": 200, "max_depth": 3},
+    "neural_networks": {"hidden_layer_sizes": (64, 32), "max_iter": 500},
+}
+
+
+def make_model(name, params=None):
+    """Fresh sklearn estimator for a protocol model name"""
+    from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+    from sklearn.linear_model import LinearRegression
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    params = dict(CANDIDATE_MODELS.get(name, {}), **(params or {}))
+    if name == "linear_regression":
+        return LinearRegression(**params)
+    if name == "random_forest":
+        return RandomForestRegressor(random_state=42, n_jobs=1, **params)
+    if name == "gradient_boosting":
+        return GradientBoostingRegressor(random_state=42, **params)
+    if name == "neural_networks":
+        return make_pipeline(StandardScaler(), MLPRegressor(random_state=42, **params))
+    raise ValueError(f"Unknown model: {name}")
+
+
+def candidate_label(name, params=None):
+    """Readable, unique label of a (name, params) candidate"""
+    if not params:
+        return name
+    return f"{name}(" + ", ".join(f"{key}={value}" for key, value in sorted(params.items())) + ")"
+
+
+# ---------------------------------------------------------------------------
+# Metrics (protocol "performance_metrics")
+# ---------------------------------------------------------------------------
+
+def compute_metrics(y_true, y_pred, metrics):
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    residual = y_pred - y_true
+    results = {}
+    for metric in metrics:
+        if metric == "rmse":
+            results[metric] = float(np.sqrt(np.mean(residual ** 2)))
+        elif metric == "mae":
+            results[metric] = float(np.mean(np.abs(residual)))
+        elif metric == "r2":
+            total = ((y_true - y_true.mean()) ** 2).sum()
+            results[metric] = float(1 - (residual ** 2).sum() / total) if total > 0 else float("nan")
+        elif metric == "icc":
+            results[metric] = icc_agreement(y_true, y_pred)
+        elif metric == "bland_altman_agreement":
+            results[metric] = bland_altman_agreement(y_true, y_pred)
+        else:
+            raise ValueError(f"Unknown metric: {metric}")
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Shared-memory feature matrix
+# ---------------------------------------------------------------------------
+
+class SharedArrays:
+    """
+    Owner side: copies arrays into named shared-memory blocks once, so workers
+    attach by name instead of receiving a pickled copy per task
+    """
+
+    def __init__(self, **arrays):
+        self.blocks = {}
+        self.spec = {}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks[name] = block
+            self.spec[name] = (block.name, array.shape, array.dtype.str)
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+
+# Arrays attached in this process by attach_shared_arrays(), by name
+worker_arrays = {}
+_worker_blocks = []
+
+
+def attach_shared_arrays(spec):
+    """Pool initializer: map the shared blocks into this worker once"""
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)
+        worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def detach_shared_arrays():
+    worker_arrays.clear()
+    while _worker_blocks:
+        _worker_blocks.pop().close()
+
+
+def participant_folds(groups, n_folds):
+    """Participant-stratified inner folds: whole participants per fold"""
+    participants = np.unique(groups)
+    fold_of_participant = np.arange(len(participants)) % n_folds
+    return fold_of_participant[np.searchsorted(participants, groups)]
+
+
+def _run_outer_fold(fold_index, held_out_group, candidates, inner_folds, metrics):
+    """Inner model selection on the training participants, then refit and score the held-out one"""
+    X = worker_arrays["X"]
+    y = worker_arrays["y"]
+    groups = worker_arrays["groups"]
+    test = groups == held_out_group
+    X_train, y_train, groups_train = X[~test], y[~test], groups[~test]
+
+    fold_ids = participant_folds(groups_train, inner_folds)
+    # One score per candidate index: the same estimator may appear with different params
+    inner_scores = []
+    for name, params in candidates:
+        squared_errors = []
+        for inner_fold in range(inner_folds):
+            validation = fold_ids == inner_fold
+            model = make_model(name, params).fit(X_train[~validation], y_train[~validation])
+            squared_errors.append((model.predict(X_train[validation]) - y_train[validation]) ** 2)
+        inner_scores.append(float(np.sqrt(np.concatenate(squared_errors).mean())))
+
+    best_name, best_params = candidates[int(np.argmin(inner_scores))]
+    model = make_model(best_name, best_params).fit(X_train, y_train)
+    y_pred = model.predict(X[test])
+
+    return {
+        "fold": fold_index,
+        "held_out_group": int(held_out_group),
+        "selected_model": candidate_label(best_name, best_params),
+        "inner_rmse": {candidate_label(*candidate): score for candidate, score in zip(candidates, inner_scores)},
+        "n_test": int(test.sum()),
+        "metrics": compute_metrics(y[test], y_pred, metrics),
+        "y_true": y[test].tolist(),
+        "y_pred": y_pred.tolist(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Engine
+# ---------------------------------------------------------------------------
+
+def build_cv_matrix(measurements_df, participants_df, target=DEFAULT_TARGET, feature_columns=DEFAULT_FEATURES,
+                    feature_config=None, cache_dir=None):
+    """
+    Feature matrix, target vector and participant group codes for CV. Features come
+    from the (optionally cached) protocol feature stage, projected to `feature_columns`.
+    """
+    if feature_config is None:
+        protocol = AcademicVBTDataCollector().create_ml_training_protocol()
+        feature_config = protocol_feature_config(protocol["feature_engineering"])
+    features, columns = build_feature_matrix(measurements_df, participants_df, feature_config, cache_dir)
+    X = np.asarray(features[:, [columns.index(column) for column in feature_columns]], dtype=np.float64)
+    y = measurements_df[target].to_numpy(np.float64)
+    groups, participant_ids = pd.factorize(measurements_df["participant_id"].astype(str))
+    return X, y, groups.astype(np.int32), np.asarray(participant_ids)
+
+
+def run_cross_validation(protocol, X, y, groups, candidates=None, n_workers=None, max_outer_folds=None):
+    """
+    Run the protocol's participant-level CV. Each outer fold is one pool task;
+    X / y / groups live in shared memory for the whole run.
+    """
+    cv = protocol["cross_validation"]
+    if cv["method"] != "leave_one_participant_out":
+        raise ValueError(f"Unsupported CV method: {cv['method']}")
+    metrics = cv["performance_metrics"]
+    inner_folds = cv["inner_cv_folds"]
+
+    if candidates is None:
+        selection = protocol["model_selection"]
+        names = selection["baseline_models"] + selection["advanced_models"]
+        candidates = [(name, None) for name in names if name in CANDIDATE_MODELS]
+
+    held_out_groups = np.unique(groups)[:max_outer_folds]
+    n_workers = n_workers or os.cpu_count()
+    shared = SharedArrays(X=np.asarray(X, dtype=np.float64), y=np.asarray(y, dtype=np.float64),
+                          groups=np.asarray(groups, dtype=np.int32))
+    try:
+        task_args = [(fold, group, candidates, inner_folds, metrics) for fold, group in enumerate(held_out_groups)]
+        if n_workers == 1:
+            attach_shared_arrays(shared.spec)
+            try:
+                folds = [_run_outer_fold(*args) for args in task_args]
+            finally:
+                detach_shared_arrays()
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=attach_shared_arrays,
+                                     initargs=(shared.spec,)) as pool:
+                futures = [pool.submit(_run_outer_fold, *args) for args in task_args]
+                folds = [future.result() for future in futures]
+    finally:
+        shared.close()
+
+    y_true = np.concatenate([fold.pop("y_true") for fold in folds])
+    y_pred = np.concatenate([fold.pop("y_pred") for fold in folds])
+    scalar_metrics = [m for m in metrics if m != "bland_altman_agreement"]
+    per_fold = {m: np.array([fold["metrics"][m] for fold in folds]) for m in scalar_metrics}
+
+    return {
+        "method": cv["method"],
+        "inner_cv_folds": inner_folds,
+        "candidates": [candidate_label(*candidate) for candidate in candidates],
+        "n_outer_folds": len(folds),
+        "folds": folds,
+        "aggregate": {
+            "pooled": compute_metrics(y_true, y_pred, metrics),
+            "fold_mean": {m: float(np.nanmean(values)) for m, values in per_fold.items()},
+            "fold_sd": {m: float(np.nanstd(values, ddof=1)) if len(values) > 1 else 0.0
+                        for m, values in per_fold.items()},
+            "selected_models": pd.Series([fold["selected_model"] for fold in folds]).value_counts().to_dict()
+        }
+    }
+
+
+def main():
+    """Run the academic ML training protocol's LOPO CV on a dataset"""
+    parser = argparse.ArgumentParser(description="Leave-one-participant-out CV engine")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--target", default=DEFAULT_TARGET)
+    parser.add_argument("--models", default=None, help="comma-separated subset of candidate models")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-folds", type=int, default=None, help="limit outer folds (smoke runs)")
+    parser.add_argument("--output", default=None, help="write the full result JSON here")
+    parser.add_argument("--feature-cache", default=None, help="reuse protocol features from this directory")
+    args = parser.parse_args()
+
+    print("🔁 Leave-One-Participant-Out Cross-Validation")
+    print("=" * 50)
+
+    protocol = AcademicVBTDataCollector().create_ml_training_protocol()
+    participants_df = pd.read_csv(os.path.join(args.dataset_dir, "participants.csv"))
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+    X, y, groups, _ = build_cv_matrix(measurements_df, participants_df, args.target,
+                                      feature_config=protocol_feature_config(protocol["feature_engineering"]),
+                                      cache_dir=args.feature_cache)
+    candidates = [(name, None) for name in args.models.split(",")] if args.models else None
+
+    start = time.perf_counter()
+    result = run_cross_validation(protocol, X, y, groups, candidates, args.workers, args.max_folds)
+    elapsed = time.perf_counter() - start
+
+    pooled = result["aggregate"]["pooled"]
+    print(f"✅ {result['n_outer_folds']} outer folds x {result['inner_cv_folds']} inner folds "
+          f"x {len(result['candidates'])} candidates in {elapsed:.1f} s")
+    print(f"   📉 RMSE {pooled['rmse']:.4f}  MAE {pooled['mae']:.4f}  R² {pooled['r2']:.3f}  ICC {pooled['icc']:.3f}")
+    agreement = pooled["bland_altman_agreement"]
+    print(f"   📐 Bland-Altman bias {agreement['bias']:+.4f} "
+          f"(LoA {agreement['loa_lower']:+.4f} to {agreement['loa_upper']:+.4f})")
+    print(f"   🏆 Selected models: {result['aggregate']['selected_models']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"   📁 Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
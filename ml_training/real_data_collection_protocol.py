@@ -4,11 +4,321 @@ Academic-Grade VBT Data Collection Protocol
 Research-quality data collection for ML model training
 """
 
+import argparse
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from columnar_storage import (
+    MEASUREMENT_STORAGE_DTYPES,
+    PARTICIPANT_STORAGE_DTYPES,
+    directory_bytes,
+    load_columnar_table,
+    write_columnar_table,
+)
+import instrumentation
+from instrumentation import stage
+from raw_signal_synthesis import TRACE_DIRNAME, write_rep_traces
+
+EXERCISES = ["squat", "bench", "deadlift"]  # Match the participant *_1rm keys
+LOAD_PERCENTAGES = [50, 70, 85, 90, 95]
+REPS_PER_LOAD = 3
+MEASUREMENTS_PER_PARTICIPANT = len(EXERCISES) * len(LOAD_PERCENTAGES) * REPS_PER_LOAD
+
+# Velocity-load relationship (validated from literature): V = intercept - slope * %1RM
+# Squat: V = 1.79 - 0.0138*%1RM (García-Ramos et al., 2018)
+# Bench: V = 1.73 - 0.0157*%1RM (García-Ramos et al., 2018)
+# Deadlift: V = 1.65 - 0.0143*%1RM (García-Ramos et al., 2018)
+VELOCITY_LOAD_EQUATIONS = {
+    "squat": (1.79, 0.0138),
+    "bench": (1.73, 0.0157),
+    "deadlift": (1.65, 0.0143),
+}
+
+PARTICIPANT_COLUMNS = [
+    "participant_id", "age", "body_mass", "height", "training_experience",
+    "squat_1rm", "bench_1rm", "deadlift_1rm"
+]
+
+MEASUREMENT_COLUMNS = [
+    "participant_id", "session_date", "exercise", "load_kg", "load_percent_1rm",
+    "rep_number", "mean_concentric_velocity", "peak_velocity", "duration_concentric",
+    "range_of_motion", "peak_force", "mean_power", "rate_of_force_development",
+    "technique_rating", "data_quality", "measurement_device", "sampling_rate",
+    "calibration_status"
+]
+
+ISO_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"  # Same text as datetime.isoformat()
+
+
+def sample_participants(rng, n_participants, first_id=1):
+    """
+    Draw a block of participants as whole arrays (vectorized engine)
+    """
+    age = rng.normal(25, 4, n_participants)  # Age 18-35
+    body_mass = rng.normal(75, 12, n_participants)  # kg
+    height = rng.normal(175, 8, n_participants)  # cm
+    training_exp = rng.exponential(2, n_participants) + 0.5  # years
+
+    # Estimated 1RM based on demographics (regression from literature)
+    squat_1rm = body_mass * (1.2 + 0.05 * training_exp) + rng.normal(0, 10, n_participants)
+    bench_1rm = body_mass * (1.0 + 0.03 * training_exp) + rng.normal(0, 8, n_participants)
+    deadlift_1rm = body_mass * (1.4 + 0.06 * training_exp) + rng.normal(0, 12, n_participants)
+
+    ids = pd.Index(np.arange(first_id, first_id + n_participants)).astype(str).str.zfill(3)
+
+    return pd.DataFrame({
+        "participant_id": np.asarray("P" + ids, dtype=object),
+        "age": age,
+        "body_mass": body_mass,
+        "height": height,
+        "training_experience": training_exp,
+        "squat_1rm": squat_1rm,
+        "bench_1rm": bench_1rm,
+        "deadlift_1rm": deadlift_1rm
+    }, columns=PARTICIPANT_COLUMNS)
+
+
+def sample_measurements(rng, participants_df, reference_time=None):
+    """
+    Build the VBT measurement table for a block of participants column by column.
+    Rows are ordered participant -> exercise -> load -> rep, like the loop engine.
+    """
+    if reference_time is None:
+        reference_time = datetime.now()
+
+    n_participants = len(participants_df)
+    set_shape = (n_participants, len(EXERCISES), len(LOAD_PERCENTAGES))
+    rep_shape = set_shape + (REPS_PER_LOAD,)
+
+    load_pct = np.asarray(LOAD_PERCENTAGES, dtype=np.float64)
+    exercise_1rm = np.stack(
+        [participants_df[f"{exercise}_1rm"].to_numpy(dtype=np.float64) for exercise in EXERCISES],
+        axis=1
+    )
+    absolute_load = exercise_1rm[:, :, None] * (load_pct / 100)
+
+    intercepts = np.array([VELOCITY_LOAD_EQUATIONS[e][0] for e in EXERCISES])
+    slopes = np.array([VELOCITY_LOAD_EQUATIONS[e][1] for e in EXERCISES])
+    base_velocity = intercepts[:, None] - slopes[:, None] * load_pct
+
+    # Individual variation (CV ~10-15% typical), one draw per set
+    individual_factor = rng.normal(1.0, 0.12, set_shape)
+
+    # Fatigue effect within set: 3% per rep
+    fatigue_factor = 1.0 - np.arange(REPS_PER_LOAD) * 0.03
+
+    mean_velocity = (base_velocity * individual_factor)[..., None] * fatigue_factor
+    mean_velocity = np.maximum(0.1, mean_velocity)  # Minimum velocity
+
+    # Related measurements based on physics and research
+    peak_velocity = mean_velocity * rng.normal(1.25, 0.05, rep_shape)
+    duration = rng.normal(1.2, 0.2, rep_shape)  # seconds
+    rom = rng.normal(0.65, 0.08, rep_shape)  # meters
+
+    # Force and power calculations
+    estimated_force = np.broadcast_to((absolute_load * 9.81)[..., None], rep_shape)  # N (simplified)
+    power = estimated_force * mean_velocity
+    rfd = estimated_force / (duration * 0.3)  # N/s
+
+    # Technique rating: higher loads typically have slightly lower technique scores
+    base_technique = (8.5 - (load_pct - 50) * 0.02)[:, None]
+    technique_score = np.clip(rng.normal(base_technique, 0.8, rep_shape), 1, 10)
+
+    data_quality = rng.uniform(0.95, 1.0, rep_shape)  # High quality
+    days_ago = rng.integers(0, 30, rep_shape)
+    session_date = np.datetime64(reference_time, "us") - days_ago.astype("timedelta64[D]")
+
+    # Index columns follow the participant -> exercise -> load -> rep grid
+    n_rows = n_participants * MEASUREMENTS_PER_PARTICIPANT
+    participant_codes, exercise_codes, load_codes, rep_codes = (
+        axis.reshape(n_rows) for axis in np.indices(rep_shape, dtype=np.int32)
+    )
+    load_column = np.asarray(LOAD_PERCENTAGES, dtype=np.int16)[load_codes]
+
+    with stage("dataframe_build", rows=n_rows):
+        measurements_df = pd.DataFrame({
+            "participant_id": pd.Categorical.from_codes(
+                participant_codes, categories=participants_df["participant_id"].to_numpy()
+            ),
+            "session_date": session_date.reshape(n_rows),
+            "exercise": pd.Categorical.from_codes(exercise_codes.astype(np.int8), categories=EXERCISES),
+            "load_kg": np.repeat(absolute_load.reshape(-1), REPS_PER_LOAD),
+            "load_percent_1rm": load_column,
+            "rep_number": (rep_codes + 1).astype(np.int8),
+            "mean_concentric_velocity": mean_velocity.reshape(n_rows),
+            "peak_velocity": peak_velocity.reshape(n_rows),
+            "duration_concentric": duration.reshape(n_rows),
+            "range_of_motion": rom.reshape(n_rows),
+            "peak_force": estimated_force.reshape(n_rows),
+            "mean_power": power.reshape(n_rows),
+            "rate_of_force_development": rfd.reshape(n_rows),
+            "technique_rating": technique_score.reshape(n_rows),
+            "data_quality": data_quality.reshape(n_rows),
+            "measurement_device": pd.Categorical.from_codes(
+                np.zeros(n_rows, dtype=np.int8), categories=["Linear Position Transducer"]
+            ),
+            "sampling_rate": np.full(n_rows, 1000, dtype=np.int16),
+            "calibration_status": pd.Categorical.from_codes(
+                np.zeros(n_rows, dtype=np.int8), categories=["passed"]
+            )
+        }, columns=MEASUREMENT_COLUMNS)
+    return measurements_df
+
+
+def generate_academic_tables(n_participants, seed=42, reference_time=None, first_id=1):
+    """
+    Vectorized engine: participants and measurements tables without any file I/O
+    """
+    rng = np.random.default_rng(seed)
+    with stage("participant_sampling", rows=n_participants):
+        participants_df = sample_participants(rng, n_participants, first_id=first_id)
+    with stage("measurement_generation", rows=n_participants * MEASUREMENTS_PER_PARTICIPANT):
+        measurements_df = sample_measurements(rng, participants_df, reference_time)
+    return participants_df, measurements_df
+
+
+def block_rng(root_seed, block_index):
+    """
+    Independent Generator for one participant block, derived from the root seed.
+    Any block can be regenerated on its own, on any worker, with identical output.
+    """
+    return np.random.default_rng(np.random.SeedSequence(root_seed, spawn_key=(block_index,)))
+
+
+def generate_academic_block(block_index, participants_per_block, n_participants, seed=42, reference_time=None):
+    """
+    Participants and measurements for one fixed-size block of the cohort
+    """
+    first_id = 1 + block_index * participants_per_block
+    block_size = min(participants_per_block, n_participants - first_id + 1)
+    rng = block_rng(seed, block_index)
+    participants_df = sample_participants(rng, block_size, first_id=first_id)
+    measurements_df = sample_measurements(rng, participants_df, reference_time)
+    return participants_df, measurements_df
+
+
+def iter_academic_chunks(n_participants, participants_per_chunk=10000, seed=42, reference_time=None):
+    """
+    Stream the cohort as (participants_df, measurements_df) chunks.
+    Only one chunk is alive at a time, so memory is bounded by the chunk size.
+    """
+    if reference_time is None:
+        reference_time = datetime.now()
+
+    n_blocks = -(-n_participants // participants_per_chunk)
+    for block_index in range(n_blocks):
+        yield generate_academic_block(block_index, participants_per_chunk, n_participants, seed, reference_time)
+
+
+TABLE_STORAGE_DTYPES = {
+    "participants": PARTICIPANT_STORAGE_DTYPES,
+    "vbt_measurements": MEASUREMENT_STORAGE_DTYPES,
+}
+
+
+def write_table_file(df, path, table, fmt):
+    """
+    Write one table in one of the supported formats: csv, parquet or vbtc
+    (typed columnar directory, see columnar_storage.py)
+    """
+    if fmt not in ("csv", "parquet", "vbtc"):
+        raise ValueError(f"Unknown table format: {fmt}")
+    with stage(f"write_{fmt}", rows=len(df)):
+        if fmt == "csv":
+            df.to_csv(path, index=False, date_format=ISO_TIMESTAMP_FORMAT)
+        elif fmt == "parquet":
+            df.to_parquet(path, index=False)
+        else:
+            write_columnar_table(df, path, TABLE_STORAGE_DTYPES[table])
+
+
+def read_table_file(path, fmt, columns=None):
+    with stage(f"read_{fmt}"):
+        if fmt == "parquet":
+            return pd.read_parquet(path, columns=columns)
+        if fmt == "vbtc":
+            return load_columnar_table(path, columns=columns)
+        return pd.read_csv(path, usecols=columns)
+
+
+def shard_filename(table, shard_index, fmt):
+    return f"{table}-{shard_index:05d}.{fmt}"
+
+
+def write_dataset_shard(shard_dir, shard_index, participants_df, measurements_df, formats=("csv", "parquet")):
+    """
+    Write one numbered shard of both tables; returns its manifest entry.
+    Files are written under a temporary name and renamed, so a shard file
+    that exists is always complete.
+    """
+    for table, df in (("participants", participants_df), ("vbt_measurements", measurements_df)):
+        for fmt in formats:
+            path = os.path.join(shard_dir, shard_filename(table, shard_index, fmt))
+            if fmt == "vbtc":
+                # Columnar tables are already swapped into place atomically
+                write_table_file(df, path, table, fmt)
+                continue
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            write_table_file(df, tmp_path, table, fmt)
+            os.replace(tmp_path, path)
+
+    first_id = int(participants_df["participant_id"].iloc[0][1:])
+    return shard_manifest_entry(shard_dir, shard_index, first_id, len(participants_df), formats)
+
+
+def shard_manifest_entry(shard_dir, shard_index, first_id, n_participants, formats):
+    """
+    Manifest entry for a shard that is already on disk
+    """
+    files = {}
+    for table in ("participants", "vbt_measurements"):
+        for fmt in formats:
+            filename = shard_filename(table, shard_index, fmt)
+            files.setdefault(table, {})[fmt] = {
+                "path": filename,
+                "bytes": directory_bytes(os.path.join(shard_dir, filename))
+            }
+
+    return {
+        "shard": shard_index,
+        "first_participant": f"P{first_id:03d}",
+        "last_participant": f"P{first_id + n_participants - 1:03d}",
+        "participants": n_participants,
+        "measurements": n_participants * MEASUREMENTS_PER_PARTICIPANT,
+        "files": files
+    }
+
+
+def shard_is_complete(shard_dir, shard_index, formats):
+    return all(
+        os.path.exists(os.path.join(shard_dir, shard_filename(table, shard_index, fmt)))
+        for table in ("participants", "vbt_measurements") for fmt in formats
+    )
+
+
+def _generate_shard_task(shard_dir, shard_index, participants_per_shard, n_participants, seed, reference_time, formats):
+    """Process-pool task: generate and write a single shard"""
+    participants_df, measurements_df = generate_academic_block(
+        shard_index, participants_per_shard, n_participants, seed, reference_time
+    )
+    return write_dataset_shard(shard_dir, shard_index, participants_df, measurements_df, formats)
+
+
+def iter_dataset_shards(output_dir, table="vbt_measurements", fmt="parquet", columns=None):
+    """
+    Read a sharded dataset back one shard at a time, in manifest order
+    """
+    with open(os.path.join(output_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    for shard in manifest["shards"]:
+        path = os.path.join(output_dir, "shards", shard["files"][table][fmt]["path"])
+        yield read_table_file(path, fmt, columns)
+
 
 class AcademicVBTDataCollector:
     """
@@ -89,15 +399,189 @@ class AcademicVBTDataCollector:
         
         return protocol
     
-    def generate_sample_academic_dataset(self, n_participants=50, output_dir="./academic_dataset"):
+    def create_dataset_metadata(self, n_participants, n_measurements):
+        """
+        Dataset metadata (dataset_metadata.json) for the given totals
+        """
+        return {
+            "dataset_info": {
+                "name": "Academic VBT Dataset",
+                "version": "1.0.0",
+                "created": datetime.now().isoformat(),
+                "participants": n_participants,
+                "measurements": n_measurements,
+                "exercises": EXERCISES,
+                "load_range": f"{min(LOAD_PERCENTAGES)}-{max(LOAD_PERCENTAGES)}% 1RM"
+            },
+            "data_collection_protocol": self.create_data_collection_protocol(),
+            "statistical_power": {
+                "effect_size": 0.5,  # Medium effect size
+                "alpha": 0.05,
+                "power": 0.80,
+                "minimum_n": 64  # For correlation analysis
+            },
+            "data_quality": {
+                "measurement_reliability": {
+                    "icc": 0.95,  # Intraclass correlation
+                    "cv": 4.2,    # Coefficient of variation %
+                    "sem": 0.03   # Standard error of measurement
+                },
+                "validity": {
+                    "criterion_validity": "Concurrent with gold standard",
+                    "construct_validity": "Factor analysis confirmed"
+                }
+            }
+        }
+    
+    def generate_sample_academic_dataset(self, n_participants=50, output_dir="./academic_dataset",
+                                         engine="vectorized", seed=42, reference_time=None,
+                                         formats=("csv",), raw_signals=False):
         """
         Generate a realistic academic dataset structure
         Based on real VBT research studies
+
+        engine="vectorized" draws every participant/load/rep variable as whole arrays;
+        engine="loop" is the original per-rep reference implementation.
+        formats may add "parquet" and "vbtc" (typed, memory-mappable columnar tables).
+        raw_signals=True also writes the 1000 Hz trace behind every rep to rep_traces/.
         """
         os.makedirs(output_dir, exist_ok=True)
         
+        if engine == "vectorized":
+            participants_df, measurements_df = generate_academic_tables(
+                n_participants, seed=seed, reference_time=reference_time
+            )
+        elif engine == "loop":
+            with stage("measurement_generation", rows=n_participants * MEASUREMENTS_PER_PARTICIPANT):
+                participants_df, measurements_df = self._generate_loop_tables(n_participants, seed)
+        else:
+            raise ValueError(f"Unknown engine: {engine}")
+        
+        # Save datasets
+        for fmt in formats:
+            write_table_file(participants_df, f"{output_dir}/participants.{fmt}", "participants", fmt)
+            write_table_file(measurements_df, f"{output_dir}/vbt_measurements.{fmt}", "vbt_measurements", fmt)
+        
+        if raw_signals:
+            with stage("raw_signal_synthesis", rows=len(measurements_df)):
+                trace_schema = write_rep_traces(measurements_df, f"{output_dir}/{TRACE_DIRNAME}",
+                                                sampling_rate=self.data_collection_standards["sampling_rate"],
+                                                seed=seed)
+        
+        # Generate metadata
+        metadata = self.create_dataset_metadata(len(participants_df), len(measurements_df))
+        
+        with stage("write_json"), open(f"{output_dir}/dataset_metadata.json", 'w') as f:
+            json.dump(metadata, f, indent=2)
+        
+        print(f"✅ Academic dataset generated:")
+        print(f"   📊 {len(participants_df)} participants")
+        print(f"   📈 {len(measurements_df)} VBT measurements")
+        if raw_signals:
+            print(f"   〰️  {trace_schema['samples']:,} raw samples at {trace_schema['sampling_rate']} Hz")
+        print(f"   📁 Saved to {output_dir}/")
+        print(f"   📋 Protocol: IRB-ready research design")
+        
+        return participants_df, measurements_df, metadata
+
+    def generate_sharded_academic_dataset(self, n_participants=50, output_dir="./academic_dataset",
+                                          participants_per_shard=10000, formats=("csv", "parquet"),
+                                          seed=42, reference_time=None, n_workers=1, resume=False):
+        """
+        Streaming variant of generate_sample_academic_dataset.
+        Writes numbered shards plus manifest.json; peak memory depends only on
+        participants_per_shard, not on n_participants.
+
+        Every shard has its own child seed derived from `seed`, so the output is
+        bit-identical for any n_workers. With resume=True only shards missing
+        from a previous (failed) run in output_dir are regenerated.
+        """
+        shard_dir = os.path.join(output_dir, "shards")
+        manifest_path = os.path.join(output_dir, "manifest.json")
+        os.makedirs(shard_dir, exist_ok=True)
+
+        if resume and os.path.exists(manifest_path):
+            # Reuse the run parameters of the interrupted run, including its reference time
+            with open(manifest_path) as f:
+                previous = json.load(f)
+            n_participants = previous["total_participants"]
+            participants_per_shard = previous["participants_per_shard"]
+            formats = tuple(previous["formats"])
+            seed = previous["seed"]
+            reference_time = datetime.fromisoformat(previous["reference_time"])
+
+        if reference_time is None:
+            reference_time = datetime.now()
+
+        n_shards = -(-n_participants // participants_per_shard)
+        manifest = {
+            "created": datetime.now().isoformat(),
+            "status": "in_progress",
+            "seed": seed,
+            "reference_time": reference_time.isoformat(),
+            "participants_per_shard": participants_per_shard,
+            "formats": list(formats),
+            "participant_columns": PARTICIPANT_COLUMNS,
+            "measurement_columns": MEASUREMENT_COLUMNS,
+            "total_participants": n_participants,
+            "total_measurements": n_participants * MEASUREMENTS_PER_PARTICIPANT,
+            "shards": []
+        }
+        # Written up front so that a failed run can be resumed with the same parameters
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        entries = {}
+        pending = []
+        for shard_index in range(n_shards):
+            first_id = 1 + shard_index * participants_per_shard
+            if resume and shard_is_complete(shard_dir, shard_index, formats):
+                block_size = min(participants_per_shard, n_participants - first_id + 1)
+                entries[shard_index] = shard_manifest_entry(shard_dir, shard_index, first_id, block_size, formats)
+            else:
+                pending.append(shard_index)
+
+        task_args = (participants_per_shard, n_participants, seed, reference_time, tuple(formats))
+        if n_workers > 1 and len(pending) > 1:
+            # Workers record their own stages and send them back with each shard
+            context = instrumentation.worker_context()
+            with ProcessPoolExecutor(max_workers=n_workers) as pool:
+                futures = [pool.submit(instrumentation.call_recorded, context, _generate_shard_task,
+                                       shard_dir, shard_index, *task_args)
+                           for shard_index in pending]
+                for future in as_completed(futures):
+                    entry, records = future.result()
+                    instrumentation.add_records(records)
+                    entries[entry["shard"]] = entry
+        else:
+            for shard_index in pending:
+                entries[shard_index] = _generate_shard_task(shard_dir, shard_index, *task_args)
+
+        manifest["status"] = "complete"
+        manifest["shards"] = [entries[shard_index] for shard_index in range(n_shards)]
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        metadata = self.create_dataset_metadata(manifest["total_participants"], manifest["total_measurements"])
+        with open(os.path.join(output_dir, "dataset_metadata.json"), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+        print(f"✅ Sharded academic dataset generated:")
+        print(f"   📊 {manifest['total_participants']} participants")
+        print(f"   📈 {manifest['total_measurements']} VBT measurements")
+        print(f"   🧩 {n_shards} shards ({', '.join(formats)}), {len(pending)} generated, "
+              f"{n_shards - len(pending)} reused")
+        print(f"   ⚙️  {max(1, n_workers)} worker(s)")
+        print(f"   📁 Saved to {output_dir}/")
+
+        return manifest, metadata
+
+    def _generate_loop_tables(self, n_participants, seed=42):
+        """
+        Reference per-rep loop engine (global NumPy RNG, one dict per row)
+        """
         # Participant demographics (realistic distributions)
-        np.random.seed(42)
+        np.random.seed(seed)
         
         participants_data = []
         vbt_measurements = []
@@ -200,54 +684,7 @@ class AcademicVBTDataCollector:
                         
                         vbt_measurements.append(measurement)
         
-        # Save datasets
-        participants_df = pd.DataFrame(participants_data)
-        measurements_df = pd.DataFrame(vbt_measurements)
-        
-        participants_df.to_csv(f"{output_dir}/participants.csv", index=False)
-        measurements_df.to_csv(f"{output_dir}/vbt_measurements.csv", index=False)
-        
-        # Generate metadata
-        metadata = {
-            "dataset_info": {
-                "name": "Academic VBT Dataset",
-                "version": "1.0.0",
-                "created": datetime.now().isoformat(),
-                "participants": len(participants_data),
-                "measurements": len(vbt_measurements),
-                "exercises": exercises,
-                "load_range": f"{min(load_percentages)}-{max(load_percentages)}% 1RM"
-            },
-            "data_collection_protocol": self.create_data_collection_protocol(),
-            "statistical_power": {
-                "effect_size": 0.5,  # Medium effect size
-                "alpha": 0.05,
-                "power": 0.80,
-                "minimum_n": 64  # For correlation analysis
-            },
-            "data_quality": {
-                "measurement_reliability": {
-                    "icc": 0.95,  # Intraclass correlation
-                    "cv": 4.2,    # Coefficient of variation %
-                    "sem": 0.03   # Standard error of measurement
-                },
-                "validity": {
-                    "criterion_validity": "Concurrent with gold standard",
-                    "construct_validity": "Factor analysis confirmed"
-                }
-            }
-        }
-        
-        with open(f"{output_dir}/dataset_metadata.json", 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        print(f"✅ Academic dataset generated:")
-        print(f"   📊 {len(participants_data)} participants")
-        print(f"   📈 {len(vbt_measurements)} VBT measurements")
-        print(f"   📁 Saved to {output_dir}/")
-        print(f"   📋 Protocol: IRB-ready research design")
-        
-        return participants_df, measurements_df, metadata
+        return pd.DataFrame(participants_data), pd.DataFrame(vbt_measurements)
     
     def create_ml_training_protocol(self):
         """
@@ -304,28 +741,62 @@ class AcademicVBTDataCollector:
 
 def main():
     """Generate academic-grade VBT dataset"""
+    parser = argparse.ArgumentParser(description="Generate academic-grade VBT dataset")
+    parser.add_argument("--participants", type=int, default=100)  # Research-quality sample size
+    parser.add_argument("--output-dir", default="./academic_vbt_dataset")
+    parser.add_argument("--shard-size", type=int, default=0,
+                        help="participants per shard; > 0 enables the streaming sharded writer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--formats", default=None,
+                        help="comma-separated table formats: csv, parquet, vbtc")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="process-pool size for sharded generation")
+    parser.add_argument("--resume", action="store_true",
+                        help="regenerate only the shards missing from a previous run")
+    parser.add_argument("--raw-signals", action="store_true",
+                        help="also synthesize per-rep 1000 Hz traces (non-sharded mode)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_args(args)
+    
     print("🎓 Academic VBT Data Collection Protocol")
     print("=" * 50)
     
     collector = AcademicVBTDataCollector()
+    formats = tuple(args.formats.split(",")) if args.formats else None
     
-    # Generate sample academic dataset
-    participants_df, measurements_df, metadata = collector.generate_sample_academic_dataset(
-        n_participants=100,  # Research-quality sample size
-        output_dir="./academic_vbt_dataset"
-    )
-    
-    # Show dataset statistics
-    print(f"\n📊 Dataset Statistics:")
-    print(f"   Age: {participants_df['age'].mean():.1f} ± {participants_df['age'].std():.1f} years")
-    print(f"   Training Exp: {participants_df['training_experience'].mean():.1f} ± {participants_df['training_experience'].std():.1f} years")
-    print(f"   Measurements per participant: {len(measurements_df) / len(participants_df):.0f}")
-    
-    # Show velocity-load relationships
-    for exercise in measurements_df['exercise'].unique():
-        exercise_data = measurements_df[measurements_df['exercise'] == exercise]
-        correlation = exercise_data['load_percent_1rm'].corr(exercise_data['mean_concentric_velocity'])
-        print(f"   {exercise.title()} velocity-load correlation: r = {correlation:.3f}")
+    if args.shard_size > 0 or args.resume:
+        # Streaming mode: bounded memory, numbered shards + manifest
+        collector.generate_sharded_academic_dataset(
+            n_participants=args.participants,
+            output_dir=args.output_dir,
+            participants_per_shard=args.shard_size or 10000,
+            formats=formats or ("csv", "parquet"),
+            seed=args.seed,
+            n_workers=args.workers,
+            resume=args.resume
+        )
+    else:
+        # Generate sample academic dataset
+        participants_df, measurements_df, metadata = collector.generate_sample_academic_dataset(
+            n_participants=args.participants,
+            output_dir=args.output_dir,
+            seed=args.seed,
+            formats=formats or ("csv",),
+            raw_signals=args.raw_signals
+        )
+        
+        # Show dataset statistics
+        print(f"\n📊 Dataset Statistics:")
+        print(f"   Age: {participants_df['age'].mean():.1f} ± {participants_df['age'].std():.1f} years")
+        print(f"   Training Exp: {participants_df['training_experience'].mean():.1f} ± {participants_df['training_experience'].std():.1f} years")
+        print(f"   Measurements per participant: {len(measurements_df) / len(participants_df):.0f}")
+        
+        # Show velocity-load relationships
+        for exercise in measurements_df['exercise'].unique():
+            exercise_data = measurements_df[measurements_df['exercise'] == exercise]
+            correlation = exercise_data['load_percent_1rm'].corr(exercise_data['mean_concentric_velocity'])
+            print(f"   {exercise.title()} velocity-load correlation: r = {correlation:.3f}")
     
     print(f"\n📋 Academic Standards:")
     print(f"   ✅ IRB-approved protocol")
@@ -336,11 +807,12 @@ def main():
     
     # Generate ML training protocol
     ml_protocol = collector.create_ml_training_protocol()
-    with open("./academic_vbt_dataset/ml_training_protocol.json", 'w') as f:
+    with stage("write_json"), open(os.path.join(args.output_dir, "ml_training_protocol.json"), 'w') as f:
         json.dump(ml_protocol, f, indent=2)
     
     print(f"   ✅ ML validation protocol")
     print(f"\n🚀 Ready for academic ML research!")
+    instrumentation.finish_from_args(args)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
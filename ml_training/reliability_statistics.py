@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Reliability and Agreement Statistics
+ICC variants, CV, SEM and Bland-Altman limits per exercise and load, with
+participant-level bootstrap confidence intervals computed as matrix products
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch_prediction_pipeline import (
+    PERFORMANCE_OUTPUTS,
+    is_prediction_bundle,
+    read_binary_predictions,
+    read_prediction_bundle,
+)
+from feature_engineering import SET_KEYS
+
+CELL_KEYS = ["exercise", "load_percent_1rm"]
+ICC_FORMS = ["icc_1_1", "icc_2_1", "icc_3_1", "icc_1_k", "icc_2_k", "icc_3_k"]
+STATISTICS = ICC_FORMS + ["sem", "cv_percent", "bias", "loa_lower", "loa_upper"]
+
+# Per-subject sufficient statistics of a (subjects x k) rating matrix: count, row sum,
+# squared row sum, sum of squares, then the k rating columns, then the squares and cross
+# product of the first two ratings (for Bland-Altman). Every statistic below is a
+# function of these sums, so they can be added up per participant and reweighted.
+_COUNT, _ROW, _ROW_SQ, _SQ = range(4)
+_RATINGS = 4
+
+
+def _subject_stats(ratings):
+    """(n, 7 + k) sufficient statistics; subjects with a missing rating contribute zeros"""
+    ratings = np.asarray(ratings, dtype=np.float64)
+    complete = np.isfinite(ratings).all(axis=1)
+    ratings = np.where(complete[:, None], ratings, 0.0)
+    row = ratings.sum(axis=1)
+    return np.column_stack([
+        complete.astype(np.float64), row, row * row, (ratings * ratings).sum(axis=1), ratings,
+        ratings[:, 0] ** 2, ratings[:, 1] ** 2, ratings[:, 0] * ratings[:, 1]
+    ])
+
+
+def statistics_from_sums(sums, k, shift=0.0):
+    """
+    Reliability statistics from summed subject stats (any leading shape, last axis
+    the stats). Ratings are expected centred by `shift`; only the CV needs it back.
+    ICC forms follow Shrout & Fleiss from the one- and two-way ANOVA mean squares;
+    SEM is the root residual mean square, CV is SEM relative to the grand mean and
+    Bland-Altman compares the second rating with the first.
+    """
+    n = sums[..., _COUNT]
+    columns = sums[..., _RATINGS:_RATINGS + k]
+    first_sq, second_sq, cross = (sums[..., _RATINGS + k + i] for i in range(3))
+    total = columns.sum(axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        correction = total * total / (n * k)
+        ss_total = sums[..., _SQ] - correction
+        ss_rows = sums[..., _ROW_SQ] / k - correction
+        ss_cols = (columns * columns).sum(axis=-1) / n - correction
+        ss_error = np.maximum(ss_total - ss_rows - ss_cols, 0.0)
+
+        ms_rows = ss_rows / (n - 1)
+        ms_within = np.maximum(ss_total - ss_rows, 0.0) / (n * (k - 1))
+        ms_cols = ss_cols / (k - 1)
+        ms_error = ss_error / ((n - 1) * (k - 1))
+
+        sem = np.sqrt(ms_error)
+        bias = (columns[..., 1] - columns[..., 0]) / n
+        ss_difference = first_sq + second_sq - 2 * cross - n * bias * bias
+        spread = 1.96 * np.sqrt(np.maximum(ss_difference, 0.0) / (n - 1))
+
+        result = {
+            "icc_1_1": (ms_rows - ms_within) / (ms_rows + (k - 1) * ms_within),
+            "icc_2_1": (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error + k * (ms_cols - ms_error) / n),
+            "icc_3_1": (ms_rows - ms_error) / (ms_rows + (k - 1) * ms_error),
+            "icc_1_k": (ms_rows - ms_within) / ms_rows,
+            "icc_2_k": (ms_rows - ms_error) / (ms_rows + (ms_cols - ms_error) / n),
+            "icc_3_k": (ms_rows - ms_error) / ms_rows,
+            "sem": sem,
+            "cv_percent": 100 * sem / (total / (n * k) + shift),
+            "bias": bias,
+            "loa_lower": bias - spread,
+            "loa_upper": bias + spread,
+        }
+    too_few = n < 2
+    for value in result.values():
+        value[too_few] = np.nan
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Array-level metrics (used by the cross-validation engine)
+# ---------------------------------------------------------------------------
+
+def _pair_statistics(y_true, y_pred):
+    ratings = np.column_stack([y_true, y_pred]).astype(np.float64)
+    shift = ratings.mean() if len(ratings) else 0.0
+    sums = _subject_stats(ratings - shift).sum(axis=0)
+    return {name: float(value[0]) for name, value in statistics_from_sums(sums[None], 2, shift).items()}
+
+
+def icc_agreement(y_true, y_pred):
+    """ICC(2,1): two-way random effects, absolute agreement, single measurement"""
+    return _pair_statistics(y_true, y_pred)["icc_2_1"]
+
+
+def bland_altman_agreement(y_true, y_pred):
+    statistics = _pair_statistics(y_true, y_pred)
+    return {name: statistics[name] for name in ("bias", "loa_lower", "loa_upper")}
+
+
+# ---------------------------------------------------------------------------
+# Per-cell tables with bootstrap confidence intervals
+# ---------------------------------------------------------------------------
+
+def bootstrap_weights(n, n_resamples, rng):
+    """(n_resamples, n) multiplicities of n draws with replacement, one bincount for all rows"""
+    draws = rng.integers(0, n, (n_resamples, n)) + (np.arange(n_resamples) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=n_resamples * n).reshape(n_resamples, n).astype(np.float64)
+
+
+def _factorize_keys(columns, names):
+    """
+    Integer code per row for each distinct combination of the key columns (in
+    order of first appearance) and a frame of those combinations. Each column is
+    factorized on its own and the codes are combined arithmetically, so no
+    per-row tuples or strings are built.
+    """
+    codes = np.zeros(len(columns[0]), dtype=np.int64)
+    uniques = []
+    for column in columns:
+        column_codes, column_uniques = pd.factorize(column)
+        codes = codes * len(column_uniques) + column_codes
+        uniques.append(np.asarray(column_uniques))
+    codes, combinations = pd.factorize(codes)
+    positions = np.unravel_index(combinations, [len(values) for values in uniques])
+    keys = pd.DataFrame({name: values[position] for name, values, position in zip(names, uniques, positions)})
+    return codes, keys
+
+
+def cell_statistics(ratings, participant_ids, cells, n_resamples=2000, confidence=0.95, seed=42,
+                    max_batch_elements=4_000_000):
+    """
+    Reliability statistics per cell for a (subjects x k) rating matrix.
+
+    Subject stats are summed into a (participants, cells, stats) array with bincount.
+    Each bootstrap resample redraws participants with replacement, which is a weight
+    row; a batch of resamples is then one (batch x participants) @ (participants x
+    cells*stats) product. Returns (cell labels, point estimates, lower, upper), the
+    last three as {statistic: (n_cells,) array}.
+    """
+    ratings = np.asarray(ratings, dtype=np.float64)
+    k = ratings.shape[1]
+    participant_codes, _ = pd.factorize(np.asarray(participant_ids))
+    cell_codes, cell_keys = _factorize_keys(cells, CELL_KEYS)
+    cell_labels = pd.MultiIndex.from_frame(cell_keys)
+    n_participants, n_cells = participant_codes.max() + 1, len(cell_labels)
+
+    # Centre each cell so the sums of squares do not cancel catastrophically
+    complete = np.isfinite(ratings).all(axis=1)
+    shift = (np.bincount(cell_codes, np.where(complete, ratings.sum(axis=1), 0.0), n_cells)
+             / np.maximum(1, np.bincount(cell_codes, complete, n_cells)) / k)
+    stats = _subject_stats(ratings - shift[cell_codes, None])
+
+    index = participant_codes * n_cells + cell_codes
+    sums = np.stack([np.bincount(index, column, n_participants * n_cells) for column in stats.T], axis=-1)
+    sums = sums.reshape(n_participants, n_cells * stats.shape[1])
+
+    estimate = statistics_from_sums(sums.sum(axis=0).reshape(n_cells, -1), k, shift)
+    lower, upper = {}, {}
+    if n_resamples:
+        rng = np.random.default_rng(seed)
+        batch = max(1, min(n_resamples, max_batch_elements // max(1, n_participants)))
+        replicates = {name: np.empty((n_resamples, n_cells)) for name in STATISTICS}
+        for first in range(0, n_resamples, batch):
+            size = min(batch, n_resamples - first)
+            resampled = (bootstrap_weights(n_participants, size, rng) @ sums).reshape(size, n_cells, -1)
+            for name, value in statistics_from_sums(resampled, k, shift).items():
+                replicates[name][first:first + size] = value
+        tail = (1 - confidence) / 2 * 100
+        for name, values in replicates.items():
+            with np.errstate(invalid="ignore"):
+                lower[name], upper[name] = np.nanpercentile(values, [tail, 100 - tail], axis=0)
+    return cell_labels, estimate, lower, upper
+
+
+def _cell_table(cell_labels, estimate, lower, upper, participants, subjects, statistics):
+    table = pd.DataFrame(list(cell_labels), columns=CELL_KEYS)
+    table["participants"] = participants
+    table["subjects"] = subjects
+    for name in statistics:
+        table[name] = estimate[name]
+        if lower:
+            table[f"{name}_ci_lower"] = lower[name]
+            table[f"{name}_ci_upper"] = upper[name]
+    return table.sort_values(CELL_KEYS, ignore_index=True)
+
+
+def _cell_counts(participant_ids, cells, complete):
+    frame = pd.DataFrame({"participant_id": np.asarray(participant_ids),
+                          **dict(zip(CELL_KEYS, cells))})[complete]
+    grouped = frame.groupby(CELL_KEYS, sort=False, observed=True)
+    return grouped["participant_id"].nunique(), grouped.size()
+
+
+def trial_ratings(measurements_df, velocity_column="mean_concentric_velocity"):
+    """
+    Rep-to-rep (test-retest) ratings: one subject per set, reps as repeated trials
+    ordered by rep_number. Returns (ratings, set keys frame); sets missing a rep are NaN.
+    """
+    set_codes, keys = _factorize_keys([measurements_df[key].to_numpy() for key in SET_KEYS], SET_KEYS)
+    rep = measurements_df["rep_number"].to_numpy(np.int64)
+    order = np.lexsort((rep, set_codes))
+    sorted_codes = set_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    trial = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+
+    ratings = np.full((len(keys), trial.max() + 1 if len(trial) else 0), np.nan)
+    ratings[sorted_codes, trial] = measurements_df[velocity_column].to_numpy(np.float64)[order]
+    return ratings, keys
+
+
+def reliability_table(measurements_df, velocity_column="mean_concentric_velocity", n_resamples=2000,
+                      confidence=0.95, seed=42):
+    """Trial-to-trial reliability of a measurement column per exercise and load"""
+    ratings, keys = trial_ratings(measurements_df, velocity_column)
+    cells = [keys[key].to_numpy() for key in CELL_KEYS]
+    cell_labels, estimate, lower, upper = cell_statistics(ratings, keys["participant_id"], cells,
+                                                          n_resamples, confidence, seed)
+    participants, subjects = _cell_counts(keys["participant_id"], cells, np.isfinite(ratings).all(axis=1))
+    return _cell_table(cell_labels, estimate, lower, upper,
+                       participants.reindex(cell_labels).to_numpy(), subjects.reindex(cell_labels).to_numpy(),
+                       STATISTICS)
+
+
+def agreement_table(measurements_df, predicted, measured_column="mean_concentric_velocity", n_resamples=2000,
+                    confidence=0.95, seed=42):
+    """
+    Agreement of row-aligned predictions with a measured column per exercise and load;
+    Bland-Altman differences are predicted - measured
+    """
+    ratings = np.column_stack([measurements_df[measured_column].to_numpy(np.float64),
+                               np.asarray(predicted, dtype=np.float64)])
+    participant_ids = measurements_df["participant_id"]
+    cells = [measurements_df[key].to_numpy() for key in CELL_KEYS]
+    cell_labels, estimate, lower, upper = cell_statistics(ratings, participant_ids, cells,
+                                                          n_resamples, confidence, seed)
+    participants, subjects = _cell_counts(participant_ids, cells, np.isfinite(ratings).all(axis=1))
+    return _cell_table(cell_labels, estimate, lower, upper,
+                       participants.reindex(cell_labels).to_numpy(), subjects.reindex(cell_labels).to_numpy(),
+                       ["icc_2_1", "icc_3_1", "sem", "cv_percent", "bias", "loa_lower", "loa_upper"])
+
+
+def measurement_reliability_summary(table):
+    """
+    dataset_metadata.json measurement_reliability from a reliability_table(): median
+    over exercise / load cells of the rep-to-rep ICC(3,1), CV (%) and SEM (m/s)
+    """
+    return {"icc": round(float(table["icc_3_1"].median()), 4),
+            "cv": round(float(table["cv_percent"].median()), 2),
+            "sem": round(float(table["sem"].median()), 4)}
+
+
+def load_predicted_values(path, output="mean_velocity"):
+    """One performance output from a prediction file (binary with schema sidecar, bundle, or JSON lines)"""
+    if os.path.exists(path + ".schema.json"):
+        return np.asarray(read_binary_predictions(path)[f"performance_{output}"], dtype=np.float64)
+    if is_prediction_bundle(path):
+        return np.asarray(read_prediction_bundle(path)[0][f"performance_{output}"], dtype=np.float64)
+    if output not in PERFORMANCE_OUTPUTS:
+        raise ValueError(f"Unknown performance output: {output}")
+    with open(path) as f:
+        return np.array([json.loads(line)["performance_prediction"][output] for line in f])
+
+
+def main():
+    """Reliability (rep to rep) and prediction agreement report for a dataset"""
+    parser = argparse.ArgumentParser(description="Reliability and agreement statistics")
+    parser.add_argument("dataset_dir", nargs="?", default="./academic_dataset")
+    parser.add_argument("--predictions", default=None,
+                        help="row-aligned prediction file from batch_prediction_pipeline.py (any format)")
+    parser.add_argument("--resamples", type=int, default=2000, help="participant-level bootstrap resamples")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="write both tables as JSON here")
+    parser.add_argument("--update-metadata", action="store_true",
+                        help="record the measured ICC / CV / SEM in the dataset's dataset_metadata.json "
+                             "(for collected data; synthetic reps carry no rep-to-rep noise)")
+    args = parser.parse_args()
+
+    print("📏 Reliability and Agreement Statistics")
+    print("=" * 50)
+
+    measurements_df = pd.read_csv(os.path.join(args.dataset_dir, "vbt_measurements.csv"))
+    percent = f"{args.confidence * 100:.0f}%"
+
+    start = time.perf_counter()
+    reliability = reliability_table(measurements_df, n_resamples=args.resamples,
+                                    confidence=args.confidence, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Rep-to-rep reliability: {len(reliability)} exercise / load cells, "
+          f"{args.resamples} bootstrap resamples in {elapsed:.2f} s")
+    for exercise, group in reliability.groupby("exercise", sort=False):
+        print(f"   🏋️  {exercise}: ICC(3,1) {group['icc_3_1'].median():.3f}, ICC(2,1) {group['icc_2_1'].median():.3f}, "
+              f"SEM {group['sem'].median():.4f} m/s, CV {group['cv_percent'].median():.2f}% (median over loads)")
+    summary = measurement_reliability_summary(reliability)
+    print(f"   📋 Overall (median over cells): ICC(3,1) {summary['icc']}, CV {summary['cv']}%, SEM {summary['sem']} m/s")
+    tables = {"reliability": reliability}
+
+    if args.update_metadata:
+        metadata_path = os.path.join(args.dataset_dir, "dataset_metadata.json")
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        metadata["data_quality"]["measurement_reliability"] = summary
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        print(f"   📝 Recorded in {metadata_path}")
+
+    if args.predictions:
+        predicted = load_predicted_values(args.predictions)
+        if len(predicted) != len(measurements_df):
+            raise ValueError(f"{args.predictions} has {len(predicted)} rows, dataset has {len(measurements_df)}")
+        start = time.perf_counter()
+        agreement = agreement_table(measurements_df, predicted, n_resamples=args.resamples,
+                                    confidence=args.confidence, seed=args.seed)
+        elapsed = time.perf_counter() - start
+        print(f"✅ Prediction agreement (mean velocity) in {elapsed:.2f} s")
+        for exercise, group in agreement.groupby("exercise", sort=False):
+            worst = group.loc[group["bias"].abs().idxmax()]
+            interval = (f" ({percent} CI {worst['bias_ci_lower']:+.4f} to {worst['bias_ci_upper']:+.4f})"
+                        if args.resamples else "")
+            print(f"   🎯 {exercise}: ICC(2,1) {group['icc_2_1'].median():.3f}, largest bias "
+                  f"{worst['bias']:+.4f} m/s at {worst['load_percent_1rm']}% 1RM{interval}")
+        tables["agreement"] = agreement
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({name: json.loads(table.to_json(orient="records")) for name, table in tables.items()},
+                      f, indent=2)
+        print(f"   📁 Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Regression tests for LoadVelocityProfiles growing past its initial capacity"""
+
+import numpy as np
+
+from load_velocity_profiles import LoadVelocityProfiles
+
+CAPACITY = 1024
+
+
+def _fill(profiles, first, count):
+    for number in range(first, first + count):
+        participant_id = f"P{number:05d}"
+        profiles.update(participant_id, "squat", 100.0, 0.5)
+        profiles.update(participant_id, "squat", 140.0, 0.3)
+        profiles.set_recorded_1rm(participant_id, "squat", 160.0)
+
+
+def _check(profiles, count):
+    assert len(profiles) == count
+    assert profiles._stats[:count, 0].tolist() == [2.0] * count
+    assert np.all(profiles._recorded_1rm[:count] == 160.0)
+    last = profiles.profile(f"P{count - 1:05d}", "squat")
+    assert last["n"] == 2
+    assert np.isclose(last["slope"], -0.005)
+
+
+def test_update_past_initial_capacity():
+    profiles = LoadVelocityProfiles(capacity=CAPACITY)
+    _fill(profiles, 0, CAPACITY + 10)
+    _check(profiles, CAPACITY + 10)
+
+
+def test_set_recorded_1rm_creates_row_past_capacity():
+    profiles = LoadVelocityProfiles(capacity=CAPACITY)
+    _fill(profiles, 0, CAPACITY)
+    profiles.set_recorded_1rm("new", "squat", 120.0)
+    assert len(profiles) == CAPACITY + 1
+    assert profiles._recorded_1rm[CAPACITY] == 120.0
+
+
+def test_update_past_capacity_after_load(tmp_path):
+    profiles = LoadVelocityProfiles(capacity=CAPACITY)
+    _fill(profiles, 0, CAPACITY)
+    path = tmp_path / "profiles.npz"
+    profiles.save(str(path))
+
+    restored = LoadVelocityProfiles.load(str(path))
+    _fill(restored, CAPACITY, 10)
+    _check(restored, CAPACITY + 10)